@@ -0,0 +1,71 @@
+"""
+binary_reader.py
+
+Reads the binary data files written by the DataLogger when DATA_FILE_FORMAT
+is 'binary' into NumPy arrays on the host PC. 
+
+    data, units = read_binary_file('data_files/data1.bin')
+    t = data['t']
+    curr = data['curr']
+
+The file can also be converted to a text file with the same columns as the
+text data files.
+
+    python binary_reader.py data_files/data1.bin > data1.txt
+
+"""
+import sys
+import numpy as np
+
+BINARY_MAGIC = 'RFWCV'
+BINARY_HEADER_SIZE = 64
+
+STRUCT_TO_DTYPE = {
+        '<': '<', 
+        '>': '>', 
+        'f': 'f4', 
+        'd': 'f8', 
+        'H': 'u2', 
+        'h': 'i2', 
+        'I': 'u4', 
+        'i': 'i4', 
+        'B': 'u1',
+        }
+
+
+def parse_header(header):
+    """ 
+    Parses the file header returning the version, the NumPy structured dtype 
+    of the records and a dictionary of column units.  
+    """
+    items = header.split()
+    if not items or items[0] != BINARY_MAGIC:
+        raise ValueError('not a rodeostat binary data file')
+    version = int(items[1])
+    fmt = items[2]
+    columns = [item.split(':') for item in items[3:]]
+    byte_order = STRUCT_TO_DTYPE[fmt[0]]
+    types = [STRUCT_TO_DTYPE[c] for c in fmt[1:]]
+    if len(types) != len(columns):
+        raise ValueError('record format does not match columns')
+    dtype = np.dtype([(name, byte_order + typ) for ((name, _), typ) in zip(columns, types)])
+    units = {name: unit for (name, unit) in columns}
+    return version, dtype, units
+
+
+def read_binary_file(path):
+    """ Returns a structured array of the records and a dictionary of column units """
+    with open(path, 'rb') as f:
+        header = f.read(BINARY_HEADER_SIZE).decode()
+        version, dtype, units = parse_header(header)
+        raw = f.read()
+    # Discard any partial record at the end of the file, e.g. after a power cut
+    num = len(raw)//dtype.itemsize
+    data = np.frombuffer(raw, dtype=dtype, count=num)
+    return data, units
+
+
+if __name__ == '__main__':
+    data, units = read_binary_file(sys.argv[1])
+    for row in data:
+        print(' '.join(f'{value:1.2f}' for value in row))
@@ -0,0 +1,347 @@
+"""
+data_ingest.py
+
+Reads the data files written by the DataLogger on the host PC and keeps an
+index of them, so that large collections of runs (e.g. the data_files
+directories copied from many PyBadges) can be loaded and exported quickly.
+
+    data, units = read_file('data_files/data1.txt')
+    t, curr = data['t'], data['curr']
+
+read_file understands all of the DataLogger layouts:
+
+    dataN.txt   t, volt, curr and, when TEMP_IN_DATA_FILE is True, temp
+    tempN.txt   t, temp, temp_avg (the temperature schedule windows)
+    dataN.bin   binary records (see binary_reader.py)
+
+Runs split into segments (DATA_SEGMENT_MAX_SIZE/DATA_SEGMENT_MAX_DT) are
+written as dataN_1.txt, dataN_2.txt, etc. and can be loaded as one run with
+read_run, e.g. read_run('data_files', 3).
+
+Text files with a '# name:units ...' header line (DATA_FILE_HEADER) use the
+columns given in the header. For files without one the columns are inferred
+from the layout and the widest row. Older data files written with
+TEMP_IN_DATA_FILE have rows without the temp column until the first
+temperature reading, which are read with a temp of nan; any other row with
+the wrong number of columns raises a ValueError. Any partial line at the end
+of a file, e.g. after a power cut, is discarded.
+
+The DataIndex scans a directory tree for data files and caches the metadata of
+each file (columns, units, row count and time span) in a JSON file, keyed by
+the file's size and modification time, so re-scans only parse new or changed
+files.
+
+    index = DataIndex('runs')
+    index.scan()
+    for entry in index.entries(kind='data'):
+        print(entry['path'], entry['rows'], entry['t_stop'])
+    index.export('runs.npz')
+
+The export concatenates the files into one columnar table, with a file_id
+column referring to the files list (in run and segment order), written as a
+parquet file when pyarrow is installed and the path ends in .parquet,
+otherwise as a NumPy .npz file.
+
+From the command line
+
+    python data_ingest.py runs --export runs.npz
+
+"""
+import os
+import re
+import sys
+import json
+import argparse
+import warnings
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from binary_reader import read_binary_file
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+INDEX_FILE = 'data_index.json'
+INDEX_VERSION = 4
+FILE_NAME_REGEX = re.compile(r'^(data|temp)(\d+)(?:_(\d+))?\.(txt|bin)$')
+
+DATA_COLUMNS = [('t', 's'), ('volt', 'V'), ('curr', 'uA'), ('temp', 'C')]
+TEMP_COLUMNS = [('t', 's'), ('temp', 'C'), ('temp_avg', 'C')]
+
+
+def parse_file_name(name):
+    """ Returns (kind, number, segment, extension) for data file names or None """
+    match = FILE_NAME_REGEX.match(name)
+    if match is None:
+        return None
+    kind, number, segment, ext = match.groups()
+    return kind, int(number), int(segment or 0), ext
+
+
+def default_columns(kind, num_columns):
+    columns = TEMP_COLUMNS if kind == 'temp' else DATA_COLUMNS
+    columns = columns[:num_columns]
+    columns += [(f'col{i}', '') for i in range(len(columns), num_columns)]
+    return columns
+
+
+def read_text_file(path, kind='data'):
+    """ Returns a dictionary of column arrays and a dictionary of column units """
+    with open(path, 'rb') as f:
+        text = f.read()
+    columns = None
+    if text.startswith(b'#'):
+        header, _, text = text.partition(b'\n')
+        columns = [tuple((item.split(':') + [''])[:2]) for item in header[1:].decode().split()]
+    if not text.endswith(b'\n'):
+        text = text[:text.rfind(b'\n') + 1]
+    values = parse_values(text, columns)
+    if values is None:
+        values, columns = parse_ragged(path, text, kind, columns)
+    elif columns is None:
+        columns = default_columns(kind, values.shape[1])
+    data = {name: values[:, i] for (i, (name, _)) in enumerate(columns)}
+    units = {name: unit for (name, unit) in columns}
+    return data, units
+
+
+def parse_values(text, columns):
+    """
+    Parses the rows of a well-formed file, all with the same number of
+    columns, in one call and returns the (rows, columns) array, or None if the
+    file isn't well-formed.
+    """
+    num_rows = text.count(b'\n')
+    if num_rows == 0 or b'\n\n' in text:
+        return None
+    first = text[:text.find(b'\n')].split()
+    last = text[text.rfind(b'\n', 0, len(text) - 1) + 1:].split()
+    num_columns = len(columns) if columns else len(last)
+    if num_columns == 0 or len(first) != num_columns or len(last) != num_columns:
+        return None
+    try:
+        with warnings.catch_warnings():
+            # Older NumPy versions stop at a bad token with a DeprecationWarning
+            warnings.simplefilter('ignore', DeprecationWarning)
+            values = np.fromstring(text, dtype=np.float64, sep=' ')
+    except ValueError:
+        return None
+    if len(values) != num_rows*num_columns:
+        return None
+    return values.reshape((num_rows, num_columns))
+
+
+def parse_ragged(path, text, kind, columns):
+    """
+    Parses the rows of a file line by line, padding the rows of older data
+    files (see pad_rows). Returns the values array and the columns.
+    """
+    rows = [line.split() for line in text.splitlines()]
+    rows = [row for row in rows if row]
+    widths = [len(row) for row in rows]
+    num_columns = len(columns) if columns else max(widths, default=0)
+    if columns is None:
+        columns = default_columns(kind, num_columns)
+    if min(widths, default=num_columns) < num_columns or max(widths, default=0) > num_columns:
+        rows = pad_rows(path, rows, columns)
+    if num_columns == 0:
+        return np.zeros((0, len(columns))), columns
+    values = np.array([token for row in rows for token in row], dtype=np.float64)
+    return values.reshape((-1, num_columns)), columns
+
+
+def pad_rows(path, rows, columns):
+    """ 
+    Pads the rows of older data files which are missing the trailing temp
+    column with nan. Raises a ValueError for any other ragged row.
+    """
+    num_columns = len(columns)
+    padded = []
+    for line_num, row in enumerate(rows, 1):
+        if len(row) == num_columns - 1 and columns[-1][0] == 'temp':
+            row = row + [b'nan']
+        elif len(row) != num_columns:
+            raise ValueError(f'{path}: row {line_num} has {len(row)} columns, expected {num_columns}')
+        padded.append(row)
+    return padded
+
+
+def read_file(path):
+    """ Reads a data, temp or binary data file. Returns the column arrays and units. """
+    name = os.path.basename(path)
+    parsed = parse_file_name(name)
+    kind = parsed[0] if parsed is not None else 'data'
+    if name.endswith('.bin'):
+        records, units = read_binary_file(path)
+        data = {name: records[name].astype(np.float64) for name in records.dtype.names}
+        # Binary records keep the time in integer ms, the text files in s
+        for name in data:
+            if units.get(name) == 'ms':
+                data[name] *= 0.001
+                units[name] = 's'
+        return data, units
+    return read_text_file(path, kind)
+
+
+def read_run(directory, number, kind='data'):
+    """ Reads a run, concatenating its segment files if it was segmented """
+    names = []
+    for name in os.listdir(directory):
+        parsed = parse_file_name(name)
+        if parsed is not None and parsed[0] == kind and parsed[1] == number:
+            names.append((parsed[2], name))
+    if not names:
+        raise FileNotFoundError(f'no {kind} files for run {number} in {directory}')
+    return concat_files([os.path.join(directory, name) for (_, name) in sorted(names)])
+
+
+def concat_files(paths):
+    """ Reads and concatenates files with the same columns """
+    parts = [read_file(path) for path in paths]
+    units = parts[0][1]
+    data = {name: np.concatenate([part[name] for (part, _) in parts]) for name in parts[0][0]}
+    return data, units
+
+
+def describe_file(path):
+    """ Returns the index entry metadata of a file """
+    data, units = read_file(path)
+    t = data.get('t', np.zeros(0))
+    return {
+            'columns' : list(data),
+            'units'   : units,
+            'rows'    : len(t),
+            't_start' : float(t[0]) if len(t) else None,
+            't_stop'  : float(t[-1]) if len(t) else None,
+            }
+
+
+class DataIndex:
+    """ Cached index of the data files in a directory tree, see module docstring """
+
+    def __init__(self, root, index_path=None, workers=None):
+        self.root = root
+        if index_path is None:
+            index_path = os.path.join(root, INDEX_FILE)
+        self.index_path = index_path
+        self.workers = workers
+        self.files = {}
+        self.load_index()
+
+    def load_index(self):
+        try:
+            with open(self.index_path) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return
+        if index.get('version') == INDEX_VERSION:
+            self.files = index['files']
+
+    def save_index(self):
+        with open(self.index_path, 'w') as f:
+            json.dump({'version': INDEX_VERSION, 'files': self.files}, f)
+
+    def find_files(self):
+        """ Yields (relative path, stat) of the data files under the root directory """
+        for dir_path, dir_names, file_names in os.walk(self.root):
+            dir_names.sort()
+            parsed_names = [(parse_file_name(name), name) for name in file_names]
+            for parsed, name in sorted([item for item in parsed_names if item[0] is not None]):
+                path = os.path.join(dir_path, name)
+                yield os.path.relpath(path, self.root), os.stat(path)
+
+    def scan(self):
+        """ Updates the index, parsing only new or changed files. Returns the number parsed. """
+        files = {}
+        stale = []
+        for rel_path, stat in self.find_files():
+            entry = self.files.get(rel_path)
+            if entry is None or entry['size'] != stat.st_size or entry['mtime'] != stat.st_mtime:
+                kind, number, segment, ext = parse_file_name(os.path.basename(rel_path))
+                entry = {
+                        'path'    : rel_path,
+                        'kind'    : kind,
+                        'number'  : number,
+                        'segment' : segment,
+                        'format'  : 'binary' if ext == 'bin' else 'text',
+                        'size'    : stat.st_size,
+                        'mtime'   : stat.st_mtime,
+                        }
+                stale.append(entry)
+            files[rel_path] = entry
+        paths = [os.path.join(self.root, entry['path']) for entry in stale]
+        if self.workers is not None and len(paths) > 1:
+            with ProcessPoolExecutor(self.workers) as executor:
+                infos = list(executor.map(describe_file, paths, chunksize=16))
+        else:
+            infos = [describe_file(path) for path in paths]
+        for entry, info in zip(stale, infos):
+            entry.update(info)
+        self.files = files
+        self.save_index()
+        return len(stale)
+
+    def entries(self, kind=None):
+        """ Returns the index entries, optionally only those of the given kind ('data' or 'temp') """
+        return [entry for entry in self.files.values() if kind is None or entry['kind'] == kind]
+
+    def load(self, entry):
+        return read_file(os.path.join(self.root, entry['path']))
+
+    def table(self, kind='data'):
+        """
+        Returns all files of the given kind concatenated into a dictionary of
+        column arrays, with a file_id column, and the list of file paths.
+        Columns missing from a file are filled with nan.
+        """
+        entries = self.entries(kind)
+        names = []
+        for entry in entries:
+            names += [name for name in entry['columns'] if name not in names]
+        columns = {name: [] for name in names}
+        file_ids = []
+        for file_id, entry in enumerate(entries):
+            data, _ = self.load(entry)
+            rows = len(next(iter(data.values()))) if data else 0
+            for name in names:
+                columns[name].append(data.get(name, np.full(rows, np.nan)))
+            file_ids.append(np.full(rows, file_id, dtype=np.int32))
+        table = {name: np.concatenate(values) if values else np.zeros(0) for (name, values) in columns.items()}
+        table['file_id'] = np.concatenate(file_ids) if file_ids else np.zeros(0, dtype=np.int32)
+        return table, [entry['path'] for entry in entries]
+
+    def export(self, path, kind='data'):
+        """ Exports the files of the given kind to a .parquet or .npz file """
+        table, files = self.table(kind)
+        if path.endswith('.parquet'):
+            if pyarrow is None:
+                raise RuntimeError('pyarrow is required for parquet export')
+            arrow_table = pyarrow.table(table)
+            arrow_table = arrow_table.replace_schema_metadata({'files': json.dumps(files)})
+            pyarrow.parquet.write_table(arrow_table, path)
+        else:
+            np.savez(path, files=np.array(files), **table)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='index and export rodeostat data files')
+    parser.add_argument('root', help='directory containing the data files')
+    parser.add_argument('--export', default=None, help='.npz or .parquet file to export to')
+    parser.add_argument('--kind', default='data', choices=['data', 'temp'], help='files to export')
+    parser.add_argument('--workers', type=int, default=None, help='number of parsing processes')
+    args = parser.parse_args()
+
+    index = DataIndex(args.root, workers=args.workers)
+    num_parsed = index.scan()
+    entries = index.entries()
+    rows = sum([entry['rows'] for entry in entries])
+    print(f'files: {len(entries)}  parsed: {num_parsed}  rows: {rows}', file=sys.stderr)
+    if args.export is not None:
+        index.export(args.export, args.kind)
+
+
+if __name__ == '__main__':
+    main()
+
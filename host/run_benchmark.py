@@ -0,0 +1,76 @@
+"""
+run_benchmark.py
+
+Runs the acquisition loop benchmark (src/benchmark.py) against the simulated
+hardware and writes the results as JSON so that firmware revisions can be
+compared.
+
+    python run_benchmark.py --samples 1000 --sample-dt 0 --output bench.json
+
+With --buffered the TIA channel is read with the simulated analogbufio
+BufferedIn instead of sample by sample.
+
+A sample period of zero runs acquisition as fast as possible. Optionally a
+label, e.g. the git revision, can be added to the results with --label.
+
+With --check-alloc the allocations made by the acquisition task in steady
+state over --samples samples are also counted (see benchmark.allocation),
+on a new app as the benchmark's stage timers allocate. The script lists the
+allocating lines and exits with an error if there are more than
+--alloc-limit allocations.
+
+    python run_benchmark.py --samples 1000 --check-alloc
+"""
+import os
+import sys
+import json
+import argparse
+import sim_env
+
+
+def main():
+    parser = argparse.ArgumentParser(description='benchmark the acquisition loop on simulated hardware')
+    parser.add_argument('--samples', type=int, default=1000, help='number of samples')
+    parser.add_argument('--sample-dt', type=float, default=0.0, help='sample period (s)')
+    parser.add_argument('--buffered', action='store_true', help='read the TIA channel with analogbufio')
+    parser.add_argument('--num-avg', type=int, default=None, help='samples averaged per measurement')
+    parser.add_argument('--label', default='', help='label stored with the results')
+    parser.add_argument('--output', default=None, help='json output file')
+    parser.add_argument('--check-alloc', action='store_true', help='check the steady state allocations')
+    parser.add_argument('--alloc-limit', type=int, default=0, help='allocation limit')
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output) if args.output else None
+    sim_env.setup()
+
+    import constants
+    import benchmark
+    from const_volt_app import ConstVoltApp
+    constants.SAMPLE_DT = args.sample_dt
+    constants.TIA_BUFFERED = args.buffered
+
+    def create_app():
+        app = ConstVoltApp()
+        if args.num_avg is not None:
+            app.pstat.averaging = args.num_avg
+        return app
+
+    results = benchmark.run(args.samples, create_app())
+    results['label'] = args.label
+    benchmark.report(results)
+    if args.check_alloc:
+        sites = {}
+        alloc = benchmark.allocation(args.samples, create_app(), sites=sites)
+        results['alloc_count'] = alloc
+        print(f'allocations: {alloc} over {args.samples} samples (limit {args.alloc_limit})')
+        for (path, line, opname), count in sorted(sites.items()):
+            print(f'  {os.path.basename(path)}:{line} {opname} x{count}')
+    if output is not None:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.check_alloc and results['alloc_count'] > args.alloc_limit:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+run_calibration.py
+
+Runs the calibration routine (src/calibration.py) against the simulated
+hardware with known analog errors and prints the calibration found together
+with the current error before and after calibration.
+
+    python run_calibration.py --range 100uA --load 10e3 --tia-gain 1.02 --adc-offset 0.005 --dac-offset -0.003
+
+"""
+import argparse
+import sim_env
+
+
+def current_error(pstat, hardware, volts):
+    """ Returns the maximum current measurement error (A) over the set-point voltages """
+    error = 0.0
+    pstat.connected = True
+    for volt in volts:
+        pstat.voltage = volt
+        expected = hardware.cell.current(hardware.cell_voltage, hardware.t)
+        error = max(error, abs(pstat.current - expected))
+    pstat.connected = False
+    return error
+
+
+def main():
+    parser = argparse.ArgumentParser(description='calibrate the simulated potentiostat')
+    parser.add_argument('--range', default='100uA', help='current range')
+    parser.add_argument('--load', type=float, default=10.0e3, help='load resistance (ohm)')
+    parser.add_argument('--tia-gain', type=float, default=1.02, help='simulated TIA gain error')
+    parser.add_argument('--adc-offset', type=float, default=0.005, help='simulated ADC offset (V)')
+    parser.add_argument('--dac-offset', type=float, default=-0.003, help='simulated DAC offset (V)')
+    parser.add_argument('--save', default=None, help='save the calibration to this file')
+    args = parser.parse_args()
+
+    hardware = sim_env.setup()
+    from sim_hardware import CellModel
+    from potentiostat import Potentiostat
+    import calibration
+
+    hardware.tia_resistor = Potentiostat.CURRENT_RANGE_TO_TIA_RESISTOR[args.range]
+    hardware.cell = CellModel(resistance=args.load)
+    hardware.tia_gain = args.tia_gain
+    hardware.adc_offset = args.adc_offset
+    hardware.dac_offset = args.dac_offset
+
+    pstat = Potentiostat(args.range)
+    volts = [-0.5, -0.25, 0.0, 0.25, 0.5]
+    error_before = current_error(pstat, hardware, volts)
+    cal = calibration.Calibration()
+    calibration.calibrate_range(pstat, cal, args.range, args.load)
+    error_after = current_error(pstat, hardware, volts)
+
+    gain, adc_offset = cal.ranges[args.range]
+    print(f'range:      {args.range}')
+    print(f'gain:       {gain:1.5f}')
+    print(f'adc_offset: {adc_offset:1.5f} V')
+    print(f'dac_offset: {cal.dac_offset:1.5f} V')
+    print(f'max error before: {1.0e6*error_before:1.4f} uA')
+    print(f'max error after:  {1.0e6*error_after:1.4f} uA')
+    if args.save:
+        cal.save(args.save)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+run_sim.py
+
+Runs the constant voltage app on the host PC against the simulated hardware
+for a fixed duration and prints the data file written. 
+
+    python run_sim.py --duration 10 --resistance 1e5 --noise 1e-8
+
+With --stream the data is also streamed over the simulated USB serial data
+port, a pseudo terminal, and received with stream_receiver.py.
+
+"""
+import os
+import argparse
+import asyncio
+import threading
+import sim_env
+
+
+def main():
+    parser = argparse.ArgumentParser(description='run the const volt app on simulated hardware')
+    parser.add_argument('--duration', type=float, default=5.0, help='run time (s)')
+    parser.add_argument('--resistance', type=float, default=100.0e3, help='cell resistance (ohm)')
+    parser.add_argument('--noise', type=float, default=0.0, help='current noise (A)')
+    parser.add_argument('--drift', type=float, default=0.0, help='current drift (A/s)')
+    parser.add_argument('--stream', action='store_true', help='stream the data over a pseudo terminal')
+    parser.add_argument('--workdir', default=None, help='working directory for data files')
+    args = parser.parse_args()
+
+    hardware = sim_env.setup(args.workdir)
+    from sim_hardware import CellModel
+    hardware.cell = CellModel(resistance=args.resistance, noise=args.noise, drift=args.drift)
+
+    import constants
+    receiver = None
+    if args.stream:
+        import usb_cdc
+        from stream_receiver import StreamReceiver
+        constants.STREAM_ENABLED = True
+        receiver = StreamReceiver(usb_cdc.open_pty())
+        result = {}
+        def receive():
+            result['data'], result['units'] = receiver.receive(duration=args.duration + 1.0)
+        thread = threading.Thread(target=receive)
+        thread.start()
+
+    from const_volt_app import ConstVoltApp
+    app = ConstVoltApp()
+    hardware.press(constants.BUTTON_START)
+    try:
+        asyncio.run(asyncio.wait_for(app.main(), args.duration))
+    except asyncio.TimeoutError:
+        pass
+    app.on_button_stop()
+
+    path = os.path.join(os.getcwd(), app.data_logger.data_file_path)
+    print(f'data file: {path}')
+    if receiver is not None:
+        thread.join()
+        receiver.close()
+        decoder = receiver.decoder
+        print(f'streamed: {decoder.records} records, {decoder.frames} frames, {decoder.lost_frames} lost, {decoder.crc_errors} crc errors')
+        for name, values in result['data'].items():
+            print(f"  {name}[{result['units'][name]}]: {values[:3]} ... {values[-1:]}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,11 @@
+""" Stand-in for adafruit_bitmap_font.bitmap_font """
+
+
+class Font:
+
+    def __init__(self, filename):
+        self.filename = filename
+
+
+def load_font(filename):
+    return Font(filename)
@@ -0,0 +1,9 @@
+""" Stand-in for adafruit_display_shapes.circle """
+
+
+class Circle:
+
+    def __init__(self, x0, y0, r, *, fill=None, outline=None, stroke=1):
+        self.x0 = x0
+        self.y0 = y0
+        self.r = r
@@ -0,0 +1,23 @@
+""" Stand-in for adafruit_display_text.label which counts text layouts """
+
+
+class Label:
+
+    layout_count = 0
+
+    def __init__(self, font, *, text='', color=0xFFFFFF, scale=1, anchor_point=None, **kwargs):
+        self.font = font
+        self.color = color
+        self.scale = scale
+        self.anchor_point = anchor_point
+        self.anchored_position = (0, 0)
+        self.text = text
+
+    @property
+    def text(self):
+        return self._text
+
+    @text.setter
+    def text(self, value):
+        Label.layout_count += 1
+        self._text = value
@@ -0,0 +1,41 @@
+""" Stand-in for adafruit_ds18x20 using the simulated temperature model """
+from sim_hardware import hardware
+
+CONVERSION_DELAY = {9: 0.094, 10: 0.188, 11: 0.375, 12: 0.750}
+
+
+class DS18X20:
+    """
+    A simulated DS18B20. The temperature is sampled from the temperature model
+    at the midpoint of the conversion and is available when the conversion
+    completes, one conversion delay after it is started. Reading before then
+    returns the result of the previous conversion (85.0 C at power on), as for
+    the real sensor.
+    """
+
+    def __init__(self, bus, address):
+        self.bus = bus
+        self.address = address
+        self.resolution = 12
+        self.t_done = None
+        self.t_sample = None
+        self.last_value = 85.0
+
+    def start_temperature_read(self):
+        delay = CONVERSION_DELAY[self.resolution]
+        self.t_done = hardware.t + delay
+        self.t_sample = hardware.t + 0.5*delay
+        return delay
+
+    def read_temperature(self):
+        if self.t_done is not None and hardware.t >= self.t_done:
+            self.last_value = hardware.temperature.temperature(self.t_sample)
+            self.t_done = None
+        return self.last_value
+
+    @property
+    def temperature(self):
+        self.start_temperature_read()
+        self.t_done = hardware.t
+        self.t_sample = hardware.t
+        return self.read_temperature()
@@ -0,0 +1,22 @@
+""" Stand-in for adafruit_ticks using the simulated hardware clock, as the keypad event timestamps """
+from sim_hardware import hardware, TICKS_PERIOD
+
+_TICKS_MAX = TICKS_PERIOD - 1
+_TICKS_HALFPERIOD = TICKS_PERIOD//2
+
+
+def ticks_ms():
+    return hardware.ticks_ms
+
+
+def ticks_add(ticks, delta):
+    return (ticks + delta) % TICKS_PERIOD
+
+
+def ticks_diff(ticks1, ticks2):
+    diff = (ticks1 - ticks2) & _TICKS_MAX
+    return ((diff + _TICKS_HALFPERIOD) & _TICKS_MAX) - _TICKS_HALFPERIOD
+
+
+def ticks_less(ticks1, ticks2):
+    return ticks_diff(ticks1, ticks2) < 0
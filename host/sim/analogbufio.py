@@ -0,0 +1,18 @@
+""" Stand-in for the CircuitPython analogbufio module """
+from sim_hardware import hardware
+
+
+class BufferedIn:
+
+    def __init__(self, pin, *, sample_rate):
+        self.pin = pin.name
+        self.sample_rate = sample_rate
+
+    def readinto(self, buffer, loop=False):
+        read_analog = hardware.read_analog
+        for i in range(len(buffer)):
+            buffer[i] = read_analog(self.pin)
+        return len(buffer)
+
+    def deinit(self):
+        pass
@@ -0,0 +1,35 @@
+""" Stand-in for the CircuitPython analogio module """
+from sim_hardware import hardware, VREF
+
+
+class AnalogIn:
+
+    def __init__(self, pin):
+        self.pin = pin.name
+        self.reference_voltage = VREF
+
+    @property
+    def value(self):
+        return hardware.read_analog(self.pin)
+
+    def deinit(self):
+        pass
+
+
+class AnalogOut:
+
+    def __init__(self, pin):
+        self.pin = pin.name
+        self._value = 0
+
+    @property
+    def value(self):
+        return self._value
+
+    @value.setter
+    def value(self, value):
+        self._value = value
+        hardware.write_analog(self.pin, value)
+
+    def deinit(self):
+        pass
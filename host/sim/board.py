@@ -0,0 +1,44 @@
+""" Stand-in for the CircuitPython board module of the PyBadge """
+from sim_hardware import hardware
+
+
+class Pin:
+
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return f'board.{self.name}'
+
+
+class Display:
+    """ A headless display which counts refreshes """
+
+    def __init__(self, width=160, height=128):
+        self.width = width
+        self.height = height
+        self.brightness = 1.0
+        self.root_group = None
+        self.auto_refresh = True
+
+    def refresh(self, target_frames_per_second=None, minimum_frames_per_second=0):
+        hardware.display_refresh_count += 1
+        return True
+
+
+A0 = Pin('A0')
+A2 = Pin('A2')
+A4 = Pin('A4')
+A6 = Pin('A6')
+D2 = Pin('D2')
+D5 = Pin('D5')
+D6 = Pin('D6')
+D9 = Pin('D9')
+D10 = Pin('D10')
+D11 = Pin('D11')
+D12 = Pin('D12')
+D13 = Pin('D13')
+BUTTON_CLOCK = Pin('BUTTON_CLOCK')
+BUTTON_OUT = Pin('BUTTON_OUT')
+BUTTON_LATCH = Pin('BUTTON_LATCH')
+DISPLAY = Display()
@@ -0,0 +1,25 @@
+""" Stand-in for the CircuitPython digitalio module """
+from sim_hardware import hardware
+
+
+class Direction:
+    INPUT = 'input'
+    OUTPUT = 'output'
+
+
+class DigitalInOut:
+
+    def __init__(self, pin):
+        self.pin = pin.name
+        self.direction = Direction.INPUT
+
+    @property
+    def value(self):
+        return hardware.read_digital(self.pin)
+
+    @value.setter
+    def value(self, value):
+        hardware.write_digital(self.pin, value)
+
+    def deinit(self):
+        pass
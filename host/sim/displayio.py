@@ -0,0 +1,46 @@
+""" Headless stand-in for the CircuitPython displayio module """
+
+
+class Palette:
+
+    def __init__(self, num_colors):
+        self.colors = [0]*num_colors
+
+    def __setitem__(self, index, value):
+        self.colors[index] = value
+
+    def __getitem__(self, index):
+        return self.colors[index]
+
+    def __len__(self):
+        return len(self.colors)
+
+
+class Bitmap:
+
+    def __init__(self, width, height, value_count):
+        self.width = width
+        self.height = height
+        self.value = 0
+
+    def fill(self, value):
+        self.value = value
+
+
+class TileGrid:
+
+    def __init__(self, bitmap, *, pixel_shader, **kwargs):
+        self.bitmap = bitmap
+        self.pixel_shader = pixel_shader
+
+
+class Group:
+
+    def __init__(self, **kwargs):
+        self.items = []
+
+    def append(self, item):
+        self.items.append(item)
+
+    def __len__(self):
+        return len(self.items)
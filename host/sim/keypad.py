@@ -0,0 +1,47 @@
+""" Stand-in for the CircuitPython keypad module using the simulated key event queue """
+from sim_hardware import hardware
+
+
+class Event:
+
+    def __init__(self, key_number=0, pressed=True, timestamp=0):
+        self.key_number = key_number
+        self.pressed = pressed
+        self.timestamp = timestamp
+
+    @property
+    def released(self):
+        return not self.pressed
+
+
+class EventQueue:
+
+    def get(self):
+        if not hardware.key_events:
+            return None
+        return Event(*hardware.key_events.popleft())
+
+    def get_into(self, event):
+        if not hardware.key_events:
+            return False
+        event.key_number, event.pressed, event.timestamp = hardware.key_events.popleft()
+        return True
+
+    def clear(self):
+        hardware.key_events.clear()
+
+    def __len__(self):
+        return len(hardware.key_events)
+
+    def __bool__(self):
+        return len(hardware.key_events) > 0
+
+
+class ShiftRegisterKeys:
+
+    def __init__(self, *, clock, data, latch, key_count, value_when_pressed, **kwargs):
+        self.key_count = key_count
+        self.events = EventQueue()
+
+    def deinit(self):
+        pass
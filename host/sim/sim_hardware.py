@@ -0,0 +1,176 @@
+"""
+sim_hardware.py
+
+Simulated hardware for running the firmware on a host PC. The stand-in
+CircuitPython modules in this directory (board, analogio, digitalio, keypad,
+displayio, adafruit_ds18x20, ...) all read and write the state of the single
+Hardware instance, hardware, defined here.
+
+    from sim_hardware import hardware, CellModel
+
+    hardware.cell = CellModel(resistance=50.0e3, noise=1.0e-8)
+    hardware.press(2)   # press and release the start button
+
+The potentiostat is modelled as follows. The set-point DAC (A0) sets the
+cell voltage relative to the virtual ground. When the counter electrode is
+connected (D13 low) the cell current is given by the cell model and the
+transimpedance amplifier output (A2) is vgnd + current*tia_resistor, clamped
+to the supply. The reference electrode input (A4) reads vgnd + cell voltage
+and the battery input (A6) reads half the battery voltage.
+
+For boards with switchable transimpedance amplifier resistors range_resistors
+can be set to a dictionary of {pin name: resistance}. The resistor of the pin
+which is set high is then used, otherwise tia_resistor is used. 
+
+    hardware.range_resistors = {'D5': 1.65e6, 'D6': 1.65e5, 'D9': 1.65e4, 'D10': 1.65e3}
+
+Analog errors for testing calibration can be set with dac_offset (V, added to
+the set-point DAC output), tia_gain (multiplies the transimpedance amplifier
+gain) and adc_offset (V, added to the transimpedance amplifier output).
+"""
+import time
+import random
+import collections
+
+VREF = 3.3
+UINT16_MAX_VALUE = 2**16 - 1
+TICKS_PERIOD = 2**29
+
+
+def volt_to_uint16(v):
+    return min(max(int(UINT16_MAX_VALUE*v/VREF), 0), UINT16_MAX_VALUE)
+
+
+def uint16_to_volt(n):
+    return VREF*n/UINT16_MAX_VALUE
+
+
+class CellModel:
+    """
+    A programmable electrochemical cell model. The current (A) is
+
+        volt/resistance + offset + drift*t + noise 
+
+    where volt is the cell voltage (V), t the time (s) since the hardware was
+    created and noise is gaussian with standard deviation noise (A). For other
+    cells a function func(volt, t) returning the noise-free current can be
+    given instead.
+    """
+
+    def __init__(self, resistance=100.0e3, offset=0.0, drift=0.0, noise=0.0, func=None, seed=None):
+        self.resistance = resistance
+        self.offset = offset
+        self.drift = drift
+        self.noise = noise
+        self.func = func
+        self.random = random.Random(seed)
+
+    def current(self, volt, t):
+        if self.func is not None:
+            value = self.func(volt, t)
+        else:
+            value = volt/self.resistance + self.offset + self.drift*t
+        if self.noise:
+            value += self.random.gauss(0.0, self.noise)
+        return value
+
+
+class TemperatureModel:
+    """ Temperature (C) of the simulated DS18B20, temp0 + drift*t """
+
+    def __init__(self, temp0=22.0, drift=0.0):
+        self.temp0 = temp0
+        self.drift = drift
+
+    def temperature(self, t):
+        return self.temp0 + self.drift*t
+
+
+class Hardware:
+
+    def __init__(self):
+        self.t0 = time.monotonic()
+        self.cell = CellModel()
+        self.tia_resistor = 16500.0
+        self.range_resistors = {}
+        self.dac_offset = 0.0
+        self.tia_gain = 1.0
+        self.adc_offset = 0.0
+        self.battery_voltage = 3.9
+        self.temperature = TemperatureModel()
+        self.have_temp_sensor = True
+        self.pin_values = {'A0': 0, 'D13': True}
+        self.key_events = collections.deque()
+        self.display_refresh_count = 0
+        self.analog_read_count = 0
+
+    @property
+    def t(self):
+        return time.monotonic() - self.t0
+
+    @property
+    def ticks_ms(self):
+        """ Millisecond ticks, as supervisor.ticks_ms, used for the key event timestamps """
+        return int(1000*self.t) % TICKS_PERIOD
+
+    @property
+    def vgnd(self):
+        return 0.5*VREF
+
+    @property
+    def connected(self):
+        return not self.pin_values.get('D13', True)
+
+    @property
+    def cell_voltage(self):
+        return uint16_to_volt(self.pin_values.get('A0', 0)) + self.dac_offset - self.vgnd
+
+    @property
+    def active_tia_resistor(self):
+        for pin, resistance in self.range_resistors.items():
+            if self.pin_values.get(pin, False):
+                return resistance
+        return self.tia_resistor
+
+    def write_analog(self, pin, value):
+        self.pin_values[pin] = value
+
+    def read_analog(self, pin):
+        self.analog_read_count += 1
+        if pin == 'A2':
+            current = 0.0
+            if self.connected:
+                current = self.cell.current(self.cell_voltage, self.t)
+            tia_voltage = current*self.tia_gain*self.active_tia_resistor + self.adc_offset
+            return volt_to_uint16(self.vgnd + tia_voltage)
+        elif pin == 'A4':
+            if self.connected:
+                return volt_to_uint16(self.vgnd + self.cell_voltage)
+            return volt_to_uint16(self.vgnd)
+        elif pin == 'A6':
+            return volt_to_uint16(0.5*self.battery_voltage)
+        return self.pin_values.get(pin, 0)
+
+    def write_digital(self, pin, value):
+        self.pin_values[pin] = value
+
+    def read_digital(self, pin):
+        return self.pin_values.get(pin, False)
+
+    def add_key_event(self, key_number, pressed):
+        self.key_events.append((key_number, pressed, self.ticks_ms))
+
+    def press(self, key_number):
+        """ Queues a press and release of the key """
+        self.add_key_event(key_number, True)
+        self.add_key_event(key_number, False)
+
+    def key_down(self, key_number):
+        """ Queues a press of the key, which is held until key_up """
+        self.add_key_event(key_number, True)
+
+    def key_up(self, key_number):
+        self.add_key_event(key_number, False)
+
+
+hardware = Hardware()
@@ -0,0 +1,48 @@
+"""
+Stand-in for the CircuitPython usb_cdc module.
+
+The data port is None until open_pty is called, which creates a pseudo
+terminal and connects usb_cdc.data to it. The receiver on the host PC can
+then open the returned device path as if it were the PyBadge's data port.
+
+    import usb_cdc
+    path = usb_cdc.open_pty()
+
+"""
+import os
+import tty
+
+console = None
+data = None
+
+
+class Serial:
+
+    def __init__(self, fd):
+        self.fd = fd
+        self.timeout = 1.0
+        self.write_timeout = None
+        self.bytes_written = 0
+
+    @property
+    def connected(self):
+        return True
+
+    def write(self, buf):
+        count = os.write(self.fd, buf)
+        self.bytes_written += count
+        return count
+
+
+def enable(console=True, data=False):
+    pass
+
+
+def open_pty():
+    """ Connects the data port to a new pseudo terminal and returns its device path """
+    global data
+    master_fd, slave_fd = os.openpty()
+    tty.setraw(slave_fd)
+    data = Serial(master_fd)
+    return os.ttyname(slave_fd)
+
@@ -0,0 +1,39 @@
+"""
+sim_env.py
+
+Sets up the host PC environment for running the firmware against the
+simulated hardware in the sim directory.
+
+    import sim_env
+    hardware = sim_env.setup()
+
+    from const_volt_app import ConstVoltApp
+    app = ConstVoltApp()
+
+The sim and src directories are put at the front of sys.path, so the firmware
+modules import the stand-in CircuitPython modules unchanged, and the working
+directory is changed to a scratch directory (a new temporary directory by
+default) containing the boot_out.txt file read by utils.is_read_only. Data
+files are written to the data_files directory in the working directory.
+"""
+import os
+import sys
+import tempfile
+
+HOST_DIR = os.path.dirname(os.path.abspath(__file__))
+SIM_DIR = os.path.join(HOST_DIR, 'sim')
+SRC_DIR = os.path.join(os.path.dirname(HOST_DIR), 'src')
+
+
+def setup(workdir=None, read_only=False):
+    for path in (SRC_DIR, SIM_DIR):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+    if workdir is None:
+        workdir = tempfile.mkdtemp(prefix='rfw_sim_')
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+    with open('boot_out.txt', 'w') as f:
+        f.write('flash read-only\n' if read_only else 'flash read-write\n')
+    from sim_hardware import hardware
+    return hardware
@@ -0,0 +1,230 @@
+"""
+stream_receiver.py
+
+Receives the data streamed live by the constant voltage app over the PyBadge's
+USB serial data port (constants.STREAM_ENABLED) and decodes it into NumPy
+arrays. See src/data_stream.py for the frame format.
+
+    receiver = StreamReceiver('/dev/ttyACM1')
+    data, units = receiver.receive(duration=10.0)
+    t, curr = data['t'], data['curr']
+
+The port is opened with pyserial when it is installed, otherwise (on Linux and
+macOS) directly as a raw tty, which also works for the pseudo terminal of the
+simulated hardware. The frames can also be decoded from any source of bytes
+with a FrameDecoder
+
+    decoder = FrameDecoder()
+    records = decoder.feed(chunk)
+
+From the command line the received data can be saved to an .npz file
+
+    python stream_receiver.py /dev/ttyACM1 --duration 60 --output data.npz
+
+"""
+import os
+import sys
+import time
+import select
+import struct
+import argparse
+import binascii
+import numpy as np
+from binary_reader import parse_header
+
+try:
+    import serial
+except ImportError:
+    serial = None
+
+STREAM_SYNC = b'\xa5\x5a'
+FRAME_HEADER_FMT = '<2sBBHH'
+FRAME_HEADER_SIZE = struct.calcsize(FRAME_HEADER_FMT)
+FRAME_CRC_SIZE = 4
+FRAME_MAX_SCHEMA = 256
+FRAME_MAX_RECORD = 64
+FRAME_TYPE_SCHEMA = 0
+FRAME_TYPE_DATA = 1
+
+
+class FrameDecoder:
+    """
+    Incremental decoder for the framed binary stream. Bytes are fed in chunks
+    of any size and the decoded records are returned as NumPy structured
+    arrays. Corrupted frames (bad CRC) are skipped by searching for the next
+    sync bytes and lost frames are counted from gaps in the sequence numbers.
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.dtype = None
+        self.units = {}
+        self.next_seq = None
+        self.frames = 0
+        self.records = 0
+        self.crc_errors = 0
+        self.lost_frames = 0
+
+    def feed(self, chunk):
+        """ Adds a chunk of bytes and returns a list of arrays of the complete records """
+        self.buffer.extend(chunk)
+        arrays = []
+        pos = 0
+        buf = self.buffer
+        while True:
+            pos = buf.find(STREAM_SYNC, pos)
+            if pos < 0:
+                # Keep a trailing byte which may be the start of the sync
+                pos = max(len(buf) - 1, 0)
+                break
+            if len(buf) - pos < FRAME_HEADER_SIZE:
+                break
+            _, frame_type, count, seq, size = struct.unpack_from(FRAME_HEADER_FMT, buf, pos)
+            if not self.valid_header(frame_type, count, size):
+                pos += 1
+                continue
+            end = pos + FRAME_HEADER_SIZE + size
+            if len(buf) < end + FRAME_CRC_SIZE:
+                break
+            crc, = struct.unpack_from('<I', buf, end)
+            if crc != binascii.crc32(buf[pos + 2:end]):
+                self.crc_errors += 1
+                pos += 1
+                continue
+            payload = bytes(buf[pos + FRAME_HEADER_SIZE:end])
+            records = self.decode(frame_type, count, seq, payload)
+            if records is not None:
+                arrays.append(records)
+            pos = end + FRAME_CRC_SIZE
+        del buf[:pos]
+        return arrays
+
+    def valid_header(self, frame_type, count, size):
+        """ 
+        Checks the header is plausible before waiting for the rest of the
+        frame, so a false sync in corrupted data doesn't stall the decoder.
+        """
+        if frame_type == FRAME_TYPE_SCHEMA:
+            return size <= FRAME_MAX_SCHEMA
+        if frame_type == FRAME_TYPE_DATA:
+            if self.dtype is not None:
+                return size == count*self.dtype.itemsize
+            return size <= count*FRAME_MAX_RECORD
+        return False
+
+    def decode(self, frame_type, count, seq, payload):
+        if self.next_seq is not None and frame_type == FRAME_TYPE_DATA:
+            self.lost_frames += (seq - self.next_seq) & 0xffff
+        self.next_seq = (seq + 1) & 0xffff
+        self.frames += 1
+        if frame_type == FRAME_TYPE_SCHEMA:
+            _, self.dtype, self.units = parse_header(payload.decode())
+            return None
+        if frame_type != FRAME_TYPE_DATA or self.dtype is None:
+            return None
+        records = np.frombuffer(payload, dtype=self.dtype, count=count)
+        self.records += len(records)
+        return records
+
+
+class RawPort:
+    """ Minimal read-only serial port for raw ttys when pyserial isn't installed """
+
+    def __init__(self, path):
+        import tty
+        self.fd = os.open(path, os.O_RDONLY | os.O_NOCTTY)
+        tty.setraw(self.fd)
+
+    def read(self, size, timeout):
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return b''
+        return os.read(self.fd, size)
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PySerialPort:
+
+    def __init__(self, path):
+        self.port = serial.Serial(path)
+
+    def read(self, size, timeout):
+        self.port.timeout = timeout
+        return self.port.read(max(min(self.port.in_waiting, size), 1))
+
+    def close(self):
+        self.port.close()
+
+
+def open_port(path):
+    if serial is not None:
+        return PySerialPort(path)
+    return RawPort(path)
+
+
+class StreamReceiver:
+
+    def __init__(self, path, chunk_size=4096):
+        self.port = open_port(path)
+        self.decoder = FrameDecoder()
+        self.chunk_size = chunk_size
+
+    def close(self):
+        self.port.close()
+
+    def receive(self, duration=None, num_records=None, timeout=0.1):
+        """
+        Receives records until duration (s) has elapsed or num_records have
+        been received, or until interrupted, and returns a dictionary of
+        column arrays and a dictionary of column units.
+        """
+        arrays = []
+        count = 0
+        t_stop = None if duration is None else time.monotonic() + duration
+        try:
+            while t_stop is None or time.monotonic() < t_stop:
+                chunk = self.port.read(self.chunk_size, timeout)
+                for records in self.decoder.feed(chunk):
+                    arrays.append(records)
+                    count += len(records)
+                if num_records is not None and count >= num_records:
+                    break
+        except KeyboardInterrupt:
+            pass
+        return to_columns(arrays, self.decoder.dtype), self.decoder.units
+
+
+def to_columns(arrays, dtype):
+    """ Concatenates arrays of records into a dictionary of column arrays """
+    if dtype is None:
+        return {}
+    records = np.concatenate(arrays) if arrays else np.zeros(0, dtype=dtype)
+    return {name: records[name].copy() for name in dtype.names}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='receive data streamed from the const volt app')
+    parser.add_argument('port', help='serial data port, e.g. /dev/ttyACM1 or COM4')
+    parser.add_argument('--duration', type=float, default=None, help='receive time (s), default until ctrl-c')
+    parser.add_argument('--output', default=None, help='.npz file for the received data')
+    args = parser.parse_args()
+
+    receiver = StreamReceiver(args.port)
+    data, units = receiver.receive(duration=args.duration)
+    receiver.close()
+    decoder = receiver.decoder
+    print(f'records: {decoder.records}  frames: {decoder.frames}  lost: {decoder.lost_frames}  crc errors: {decoder.crc_errors}', file=sys.stderr)
+    if args.output is not None:
+        np.savez(args.output, **data)
+    else:
+        names = list(data)
+        print(f"# {' '.join(f'{name}:{units[name]}' for name in names)}")
+        for row in zip(*[data[name] for name in names]):
+            print(' '.join(f'{value:1.4f}' for value in row))
+
+
+if __name__ == '__main__':
+    main()
+
@@ -0,0 +1,62 @@
+"""
+test_allocation.py
+
+Checks that the acquisition loop doesn't allocate in steady state when run
+against the simulated hardware (see benchmark.allocation).
+
+    python -m unittest test_allocation
+
+"""
+import os
+import unittest
+import sim_env
+
+sim_env.setup()
+
+import constants
+import benchmark
+from const_volt_app import ConstVoltApp
+
+NUM_SAMPLES = 500
+
+
+class TestAllocation(unittest.TestCase):
+
+    def setUp(self):
+        self.saved = {name: getattr(constants, name) for name in ('SAMPLE_DT', 'DATA_FILE_FORMAT')}
+        constants.SAMPLE_DT = 0.0
+
+    def tearDown(self):
+        for name, value in self.saved.items():
+            setattr(constants, name, value)
+
+    def check_no_allocation(self, app):
+        sites = {}
+        alloc = benchmark.allocation(NUM_SAMPLES, app, sites=sites)
+        lines = [f'{os.path.basename(path)}:{line} {opname} x{count}' for ((path, line, opname), count) in sites.items()]
+        self.assertEqual(alloc, 0, f'allocations in steady state: {lines}')
+
+    def test_text_file(self):
+        constants.DATA_FILE_FORMAT = 'text'
+        self.check_no_allocation(ConstVoltApp())
+
+    def test_binary_file(self):
+        constants.DATA_FILE_FORMAT = 'binary'
+        self.check_no_allocation(ConstVoltApp())
+
+    def test_per_sample_objects_are_counted(self):
+        app = ConstVoltApp()
+        acquire = app.acquire
+
+        def acquire_with_dict():
+            data = {'t': app.t, 'volt': app.volt, 'curr': app.curr_ua}
+            acquire()
+
+        app.acquire = acquire_with_dict
+        paths = (sim_env.SRC_DIR + os.sep, os.path.abspath(__file__))
+        alloc = benchmark.allocation(NUM_SAMPLES, app, paths=paths)
+        self.assertGreaterEqual(alloc, NUM_SAMPLES)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+class AutoRanger:
+    """
+    Implements automatic current range selection for the potentiostat. 
+
+        autoranger = AutoRanger(pstat)
+        current = autoranger.current
+
+    The transimpedance amplifier voltage is measured and compared with the
+    full scale voltage (vgnd) of the current range. When the magnitude of the
+    voltage is above high*vgnd the next larger current range is selected and 
+    when it is below low*vgnd the next smaller one. As the ranges are a factor
+    of 10 apart a low threshold below high/10 gives hysteresis, so the range
+    doesn't flip back and forth. After each range change settle measurements
+    are discarded while the amplifier settles and the current is measured again.
+    The current is always converted with the range it was measured on.
+
+    The reference electrode voltage can be measured together with the current
+    using the measure method.
+
+        current, ref_voltage = autoranger.measure(with_ref=True)
+
+    The active range is available as 
+
+        autoranger.current_range:     range name, e.g. '100uA'
+        autoranger.full_scale:        full scale current of the range (uA)
+
+    The potentiostat must have a range select output for every current range
+    (range_pins). On the stock board, with its fixed TIA resistor, switching
+    ranges would only change the current scaling, so a ValueError is raised.
+
+    """
+
+    def __init__(self, pstat, high=0.9, low=0.08, settle=3):
+        self.pstat = pstat
+        self.high = high
+        self.low = low
+        self.settle = settle
+        resistor_to_range = pstat.TIA_RESISTOR_TO_CURRENT_RANGE
+        self.ranges = [resistor_to_range[r] for r in sorted(resistor_to_range, reverse=True)]
+        missing = [name for name in self.ranges if name not in pstat.range_switches]
+        if missing:
+            raise ValueError(f'autoranging needs range select pins, none for {missing}')
+        self.range_to_full_scale = {name: self.parse_range(name) for name in self.ranges}
+        self.index = self.ranges.index(pstat.current_range)
+        self.num_changes = 0
+
+    @staticmethod
+    def parse_range(name):
+        return float(name.replace('uA', ''))
+
+    @property
+    def current_range(self):
+        return self.ranges[self.index]
+
+    @property
+    def full_scale(self):
+        return self.range_to_full_scale[self.current_range]
+
+    def select(self, index):
+        self.index = index
+        self.pstat.current_range = self.ranges[index]
+        self.num_changes += 1
+        for i in range(self.settle):
+            self.pstat.tia_voltage
+
+    @property
+    def current(self):
+        return self.measure()[0]
+
+    def measure(self, with_ref=False):
+        """ Returns the current and, if with_ref is True, the reference electrode voltage """
+        vgnd = self.pstat.vgnd
+        ref_voltage = None
+        num_passes = len(self.ranges)
+        for i in range(num_passes + 1):
+            if with_ref:
+                volt, ref_voltage = self.pstat.measure_voltages()
+            else:
+                volt = self.pstat.tia_voltage
+            if i == num_passes:
+                # The last pass changed range, so this measurement on the new
+                # range is used without checking it again
+                break
+            frac = abs(volt)/vgnd
+            if frac > self.high and self.index < len(self.ranges) - 1:
+                self.select(self.index + 1)
+            elif frac < self.low and self.index > 0:
+                self.select(self.index - 1)
+            else:
+                break
+        return self.pstat.tia_to_current(volt), ref_voltage
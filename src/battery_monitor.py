@@ -18,7 +18,7 @@ class BatteryMonitor:
         monitor.update()
 
     This method should be called periodically with an regular time step
-    equal to constants.LOOP_DT. 
+    equal to constants.BATTERY_DT. 
 
     The battery voltage is available in both raw 
 
@@ -48,12 +48,12 @@ class BatteryMonitor:
             for i in range(self.VOLT_NUM_INIT):
                 dummy = self.voltage_raw
 
-            #Create lowpass filter. Note dt doesn't really matter here as we just 
-            # want to smooth the battery values a bit
+            #Create lowpass filter. The update method is run by the scheduler
+            # with a fixed time step of constants.BATTERY_DT.
             self.lowpass = lowpass_filter.LowpassFilter(
                     freq_cutoff = self.FREQ_CUTOFF, 
                     value = self.voltage_raw,  
-                    dt = 0.2, 
+                    dt = constants.BATTERY_DT, 
                     )
         else:
             # Update filter on new reading
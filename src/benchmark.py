@@ -0,0 +1,315 @@
+"""
+benchmark.py
+
+Benchmark harness for the acquisition loop of the constant voltage app. Runs
+on the PyBadge (from the REPL) or on a host PC against the simulated hardware
+(see host/run_benchmark.py).
+
+    import benchmark
+    results = benchmark.run(num_samples=500)
+    benchmark.save(results, 'bench.json')
+
+The app is run with ConstVoltApp.run until num_samples samples have been
+acquired. The stages of the loop are wrapped with timers and the results give
+the sample rate, the p50/p99/max loop latency (time between successive
+samples) and, for each stage, the call count and the total, mean and max time
+spent.
+
+Stages:
+
+    button:             button handling
+    battery:            battery_monitor.update
+    temperature:        temperature sensor update/read
+    display:            display setters
+    display.refresh:    display refresh
+    pstat.current:      analog input acquisition and averaging
+    data_logger.update: data logging
+    acquire:            the whole acquisition task
+
+The steady state heap allocation of the acquisition task can be checked with
+
+    alloc = benchmark.allocation(num_samples=200)
+
+which returns the allocations made over num_samples samples, measured in a
+second window after the warm-up samples and a first window of num_samples,
+so that one-off costs (buffers, caches, file opens) are left out. On
+CircuitPython this is the bytes allocated, measured with gc.mem_alloc with
+the garbage collector disabled. On a host PC short-lived objects are freed
+immediately, often into CPython's freelists, so heap measurements can't see
+them. Instead the allocating bytecodes executed by the firmware are counted
+with an AllocationCounter. Both should be zero.
+
+"""
+import gc
+import sys
+import json
+import time
+import constants
+
+DISPLAY_SETTERS = [
+        'set_running',
+        'set_time',
+        'set_volt',
+        'set_curr',
+        'set_temp',
+        'set_vbat',
+        'set_mode',
+        'set_file',
+        ]
+
+
+class StopBenchmark(Exception):
+    pass
+
+
+class StageTimer:
+
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+    def wrap(self, func):
+        def wrapper(*args, **kwargs):
+            t0 = time.monotonic_ns()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                dt = time.monotonic_ns() - t0
+                self.count += 1
+                self.total_ns += dt
+                if dt > self.max_ns:
+                    self.max_ns = dt
+        return wrapper
+
+    def results(self, elapsed_ns):
+        return {
+                'count'    : self.count,
+                'total_ms' : 1.0e-6*self.total_ns,
+                'mean_us'  : 1.0e-3*self.total_ns/self.count if self.count else 0.0,
+                'max_us'   : 1.0e-3*self.max_ns,
+                'fraction' : self.total_ns/elapsed_ns if elapsed_ns else 0.0,
+                }
+
+
+class Benchmark:
+    """
+    Instruments a ConstVoltApp instance and runs it for num_samples samples.
+
+        bench = Benchmark(ConstVoltApp(), 500)
+        results = bench.run()
+
+    """
+
+    def __init__(self, app, num_samples):
+        self.app = app
+        self.num_samples = num_samples
+        self.timers = {}
+        self.sample_times = []
+        self.t_start_ns = 0
+        self.t_stop_ns = 0
+        self.instrument()
+
+    def timer(self, name):
+        if name not in self.timers:
+            self.timers[name] = StageTimer(name)
+        return self.timers[name]
+
+    def wrap_task(self, task_name, stage_name):
+        task = self.app.scheduler.task_by_name.get(task_name)
+        if task is not None:
+            task.func = self.timer(stage_name).wrap(task.func)
+
+    def instrument(self):
+        app = self.app
+
+        # Scheduler tasks (only present when run without asyncio)
+        self.wrap_task('button', 'button')
+        self.wrap_task('temperature', 'temperature')
+        self.wrap_task('battery', 'battery')
+
+        # Coroutine based tasks call these methods directly
+        app.on_button = self.timer('button').wrap(app.on_button)
+        sensor = app.temperature_sensor
+        if sensor.have_sensor and 'temperature' not in app.scheduler.task_by_name:
+            sensor.sensor.read_temperature = self.timer('temperature').wrap(sensor.sensor.read_temperature)
+
+        for name in DISPLAY_SETTERS:
+            setattr(app.display, name, self.timer('display').wrap(getattr(app.display, name)))
+        app.display.refresh = self.timer('display.refresh').wrap(app.display.refresh)
+        for name in ('read_ain_sum', 'read_ain_pair_avg', 'read_ain_filtered'):
+            setattr(app.pstat, name, self.timer('pstat.current').wrap(getattr(app.pstat, name)))
+        app.data_logger.update = self.timer('data_logger.update').wrap(app.data_logger.update)
+
+        acquire_task = app.scheduler.task_by_name['acquire']
+        acquire_timed = self.timer('acquire').wrap(acquire_task.func)
+
+        def acquire():
+            if app.running:
+                self.sample_times.append(time.monotonic_ns())
+            acquire_timed()
+            if len(self.sample_times) >= self.num_samples:
+                raise StopBenchmark
+        acquire_task.func = acquire
+
+    def run(self):
+        gc.collect()
+        self.app.on_button_start()
+        self.t_start_ns = time.monotonic_ns()
+        try:
+            self.app.run()
+        except StopBenchmark:
+            pass
+        self.t_stop_ns = time.monotonic_ns()
+        self.app.on_button_stop()
+        return self.results()
+
+    def results(self):
+        elapsed_ns = self.t_stop_ns - self.t_start_ns
+        times = self.sample_times
+        latency = sorted([t1 - t0 for (t0, t1) in zip(times[:-1], times[1:])])
+        num = len(times)
+        results = {
+                'platform'       : sys.platform,
+                'implementation' : sys.implementation.name,
+                'version'        : sys.version,
+                'sample_dt'      : constants.SAMPLE_DT,
+                'num_avg'        : self.app.pstat.num_avg,
+                'num_samples'    : num,
+                'elapsed_s'      : 1.0e-9*elapsed_ns,
+                'samples_per_s'  : 1.0e9*num/elapsed_ns if elapsed_ns else 0.0,
+                'latency_ms'     : {
+                    'p50' : 1.0e-6*percentile(latency, 50),
+                    'p99' : 1.0e-6*percentile(latency, 99),
+                    'max' : 1.0e-6*latency[-1] if latency else 0.0,
+                    },
+                'stages'         : {k: v.results(elapsed_ns) for (k, v) in self.timers.items()},
+                }
+        return results
+
+
+def allocation(num_samples=200, app=None, num_warmup=50, paths=None, sites=None):
+    """ 
+    Returns the heap allocations made by the acquisition task over
+    num_samples samples in steady state, bytes on CircuitPython and
+    allocating bytecodes executed on CPython.
+    """
+    if app is None:
+        from const_volt_app import ConstVoltApp
+        app = ConstVoltApp()
+    app.on_button_start()
+    for i in range(num_warmup):
+        app.acquire()
+    for i in range(num_samples):
+        app.acquire()
+    if hasattr(gc, 'mem_alloc'):
+        gc.collect()
+        gc.disable()
+        alloc0 = gc.mem_alloc()
+        for i in range(num_samples):
+            app.acquire()
+        alloc = gc.mem_alloc() - alloc0
+        gc.enable()
+    else:
+        if paths is None:
+            import os
+            paths = (os.path.dirname(os.path.abspath(__file__)) + os.sep,)
+        counter = AllocationCounter(paths, sites)
+        counter.start()
+        try:
+            for i in range(num_samples):
+                app.acquire()
+        finally:
+            counter.stop()
+        alloc = counter.count
+    app.on_button_stop()
+    return alloc
+
+
+class AllocationCounter:
+    """
+    Counts the allocating bytecodes, e.g. building a dict, list, tuple, slice
+    or formatted string, executed by code from the given paths on CPython.
+
+        counter = AllocationCounter([src_dir], sites={})
+        counter.start()
+        ...
+        counter.stop()
+
+    CPython's freelists reuse memory for short-lived dicts, lists and floats
+    without going through its allocator, so tracemalloc can't see them, but
+    on CircuitPython each of these operations allocates from the heap.
+    Floats aren't counted, as they aren't heap objects on CircuitPython. 
+    If sites is given it is filled with the count for each (file, line,
+    opcode).
+    """
+
+    def __init__(self, paths, sites=None):
+        import dis
+        self.paths = tuple(paths)
+        self.sites = sites
+        self.opname = dis.opname
+        self.opcodes = set([op for (name, op) in dis.opmap.items() if self.allocates(name)])
+        self.count = 0
+
+    @staticmethod
+    def allocates(name):
+        if name.startswith('BUILD_') or name.startswith('FORMAT_'):
+            return True
+        return name in ('MAKE_FUNCTION', 'CALL_FUNCTION_EX', 'LIST_TO_TUPLE')
+
+    def start(self):
+        self.count = 0
+        sys.settrace(self.trace)
+
+    def stop(self):
+        sys.settrace(None)
+
+    def trace(self, frame, event, arg):
+        if not frame.f_code.co_filename.startswith(self.paths):
+            return None
+        frame.f_trace_lines = False
+        frame.f_trace_opcodes = True
+        return self.trace_opcode
+
+    def trace_opcode(self, frame, event, arg):
+        if event == 'opcode':
+            op = frame.f_code.co_code[frame.f_lasti]
+            if op in self.opcodes:
+                self.count += 1
+                if self.sites is not None:
+                    site = (frame.f_code.co_filename, frame.f_lineno, self.opname[op])
+                    self.sites[site] = self.sites.get(site, 0) + 1
+        return self.trace_opcode
+
+
+def percentile(values, p):
+    """ Returns the p-th percentile of a sorted list (nearest rank) """
+    if not values:
+        return 0.0
+    index = min(int(0.01*p*len(values)), len(values) - 1)
+    return values[index]
+
+
+def run(num_samples=500, app=None):
+    """ Runs the benchmark on a new (or the given) ConstVoltApp """
+    if app is None:
+        from const_volt_app import ConstVoltApp
+        app = ConstVoltApp()
+    return Benchmark(app, num_samples).run()
+
+
+def save(results, path):
+    with open(path, 'w') as f:
+        json.dump(results, f)
+
+
+def report(results):
+    """ Prints a summary of the results to the serial console """
+    latency = results['latency_ms']
+    print(f"samples: {results['num_samples']}  rate: {results['samples_per_s']:1.1f}/s")
+    print(f"latency: p50={latency['p50']:1.3f}ms p99={latency['p99']:1.3f}ms max={latency['max']:1.3f}ms")
+    for name, stage in results['stages'].items():
+        print(f"{name:20s} count={stage['count']:6d} mean={stage['mean_us']:9.1f}us max={stage['max_us']:9.1f}us {100*stage['fraction']:5.1f}%")
+
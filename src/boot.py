@@ -5,12 +5,15 @@ Run on startup after powerup of after a hard reset.  Run before code.py. This
 file can be used to set the device configuration. 
 
 Currently setup to remount the flash drive as read-only for circuitpython if any
-key is pressed during startup. 
+key is pressed during startup. Also enables the USB serial data port when
+constants.STREAM_ENABLED is True. 
 """
 import time
 import board
 import keypad
 import storage
+import usb_cdc
+import constants
 
 # Setup keypad for button entry
 pad = keypad.ShiftRegisterKeys( 
@@ -46,6 +49,9 @@ else:
 # Actually remount the flash storage  
 storage.remount("/", readonly=read_only)
 
+# Enable the USB serial data port used for live data streaming
+usb_cdc.enable(console=True, data=constants.STREAM_ENABLED)
+
 # De-initialize the pad so we can use it later
 pad.deinit()
 del pad
@@ -0,0 +1,142 @@
+import os
+import time
+
+
+class BufferedWriter:
+    """
+    Implements an accumulate-and-flush layer for files written by the
+    DataLogger.
+
+        writer = BufferedWriter(open(path, 'wb'), size=1024, flush_dt=5.0, sync_dt=10.0, slack=100)
+
+    Text written to the writer is accumulated in a preallocated RAM buffer and
+    written to the file in a single write when either a block of size bytes
+    is full or flush_dt seconds have passed since the last flush. The buffer
+    has slack bytes of room past the block, so a row which doesn't fit in the
+    block is still written in place. Full blocks are written from a
+    preallocated view and the bytes past the block moved to the start of the
+    buffer, so block writes don't allocate and are always size bytes. After
+    a flush the filesystem is synced with os.sync if sync_dt seconds have
+    passed since the last sync. Data waits up to flush_dt to be flushed and
+    the sync happens at the first flush after sync_dt has passed, up to
+    flush_dt later, so a power cut loses at most about flush_dt + sync_dt
+    seconds of data.
+
+    Bytes, e.g. blocks from a RecordBuffer, are assumed to already be large
+    and are written straight through to the file after any buffered text.
+
+    Text can also be written in place, without allocating, by reserving space
+    in the buffer, writing into writer.buffer from the returned position and
+    committing the new position, e.g. with ColumnSchema.format_into
+
+        pos = writer.reserve(schema.max_line)
+        writer.commit(schema.format_into(writer.buffer, pos, values))
+
+    Files which aren't written on every sample, e.g. the temperature file
+    between schedule windows, should also be polled so that buffered data
+    isn't kept for longer than flush_dt
+
+        writer.flush_if_due()
+
+    The amount of buffered data and the time spent flushing are available as
+
+        writer.buffered:        number of bytes (characters) buffered
+        writer.bytes_written:   number of bytes (characters) written in total
+        writer.flush_count:     number of flushes
+        writer.flush_time:      time taken by the last flush (s)
+        writer.flush_time_max:  maximum time taken by a flush (s)
+
+    """
+
+    def __init__(self, fid, size, flush_dt, sync_dt, slack=0):
+        self.fid = fid
+        self.size = size
+        self.flush_dt = flush_dt
+        self.sync_dt = sync_dt
+        self.buffer = bytearray(size + slack)
+        self.view = memoryview(self.buffer)
+        self.block = self.view[:size]
+        self.buffered = 0
+        self.bytes_written = 0
+        self.flush_count = 0
+        self.flush_time = 0.0
+        self.flush_time_max = 0.0
+        self.t_flush = time.monotonic()
+        self.t_sync = self.t_flush
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode()
+            pos = self.reserve(len(data))
+            if pos + len(data) <= len(self.buffer):
+                self.buffer[pos:pos + len(data)] = data
+                self.commit(pos + len(data))
+                return
+        self.write_buffer()
+        self.fid.write(data)
+        self.bytes_written += len(data)
+        if self.flush_due():
+            self.flush()
+
+    def reserve(self, size):
+        """ Makes room for size bytes in the buffer and returns the position to write at """
+        if self.buffered + size > len(self.buffer):
+            self.write_buffer()
+        return self.buffered
+
+    def commit(self, pos):
+        """ Sets the end of the data written in place into the buffer """
+        self.bytes_written += pos - self.buffered
+        self.buffered = pos
+        if self.buffered >= self.size:
+            self.flush_block()
+        elif self.flush_due():
+            self.flush()
+
+    def write_buffer(self):
+        if self.buffered:
+            self.fid.write(self.view[:self.buffered])
+            self.buffered = 0
+
+    def write_block(self):
+        """ Writes the full block and moves any bytes past it to the start of the buffer """
+        self.fid.write(self.block)
+        buf = self.buffer
+        size = self.size
+        rest = self.buffered - size
+        for i in range(rest):
+            buf[i] = buf[size + i]
+        self.buffered = rest
+
+    def flush_due(self):
+        return time.monotonic() - self.t_flush >= self.flush_dt
+
+    def flush_if_due(self):
+        """ Flushes any buffered data if flush_dt has passed since the last flush """
+        if self.buffered and self.flush_due():
+            self.flush()
+
+    def flush(self):
+        t0 = time.monotonic_ns()
+        self.write_buffer()
+        self.flush_file(t0)
+
+    def flush_block(self):
+        t0 = time.monotonic_ns()
+        self.write_block()
+        self.flush_file(t0)
+
+    def flush_file(self, t0):
+        self.fid.flush()
+        self.t_flush = time.monotonic()
+        if self.t_flush - self.t_sync >= self.sync_dt:
+            os.sync()
+            self.t_sync = self.t_flush
+        self.flush_count += 1
+        self.flush_time = 1.0e-9*(time.monotonic_ns() - t0)
+        self.flush_time_max = max(self.flush_time, self.flush_time_max)
+
+    def close(self):
+        self.write_buffer()
+        self.fid.close()
+
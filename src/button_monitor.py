@@ -1,37 +1,89 @@
 import board
 import keypad
+from adafruit_ticks import ticks_ms, ticks_add, ticks_diff
 
 class ButtonMonitor:
 
     """
-    A button monitor or the PyBadge.  Only monitors for released events. 
+    A button monitor for the PyBadge.
 
         button_monitor = ButtonMonitor()
 
-    Check for events using the events method. 
+    Each call to update drains the keypad event queue, so a burst of presses
+    is handled in one tick however slowly it is called, and calls the
+    callback with the key number of each action
 
-        event = button_monitor.event()
+        button_monitor.update(callback)
 
-    The returned value, event, will be the the number of the key pressed and
-    released to generate the event. 
+    where the callback is called as callback(key, repeat, t). For most keys
+    the action happens when the key is released, with repeat equal to 0. Keys
+    in repeat_keys act when pressed instead and, while held, repeat after
+    repeat_delay seconds every repeat_period seconds with repeat counting the
+    repeats (1, 2, 3, ...), so the callback can e.g. switch to a larger
+    step, a long-press action, after a number of repeats.
+
+    The time t is the keypad's timestamp of the event in ms ticks
+    (supervisor.ticks_ms, compared with adafruit_ticks.ticks_diff), so it
+    gives when the key changed rather than when the queue was drained. Repeats
+    are timed from the press timestamp and passed the tick they became due
+    at. The keypad, or any object with an events queue supporting get_into
+    with timestamped events, can be given as pad, e.g. a fake event source for
+    testing, together with a clock returning ms ticks.
+
+    Alternatively the monitor can be run as a coroutine which calls update
+    every period seconds.
+
+        await button_monitor.run(callback, period, asyncio.sleep)
 
     """
 
-    def __init__(self):
-        self.pad = keypad.ShiftRegisterKeys( 
-                clock=board.BUTTON_CLOCK, 
-                data=board.BUTTON_OUT, 
-                latch=board.BUTTON_LATCH, 
-                key_count=8, 
-                value_when_pressed=True,
-                )
-
-    @property
-    def events(self):
-        key = None
-        event = self.pad.events.get()
-        if event is not None:  
-            if event.released:
-                key = event.key_number
-        return key
+    def __init__(self, pad=None, repeat_keys=(), repeat_delay=0.5, repeat_period=0.1, clock=ticks_ms):
+        if pad is None:
+            pad = keypad.ShiftRegisterKeys(
+                    clock=board.BUTTON_CLOCK,
+                    data=board.BUTTON_OUT,
+                    latch=board.BUTTON_LATCH,
+                    key_count=8,
+                    value_when_pressed=True,
+                    )
+        self.pad = pad
+        self.repeat_keys = repeat_keys
+        self.repeat_delay = int(1000*repeat_delay)
+        self.repeat_period = int(1000*repeat_period)
+        self.clock = clock
+        self.event = keypad.Event()
+        self.held = {key: False for key in repeat_keys}
+        self.repeat_time = {key: 0 for key in repeat_keys}
+        self.repeat_count = {key: 0 for key in repeat_keys}
+
+    def update(self, callback):
+        event = self.event
+        while self.pad.events.get_into(event):
+            key = event.key_number
+            t = event.timestamp
+            if key in self.held:
+                self.held[key] = event.pressed
+                if event.pressed:
+                    self.repeat_time[key] = ticks_add(t, self.repeat_delay)
+                    self.repeat_count[key] = 0
+                    callback(key, 0, t)
+            elif event.released:
+                callback(key, 0, t)
+        now = self.clock()
+        for key in self.repeat_keys:
+            t = self.repeat_time[key]
+            if self.held[key] and ticks_diff(now, t) >= 0:
+                # Repeats stay on the grid from the press, but repeats missed
+                # by a late update are dropped rather than bunched
+                next_time = ticks_add(t, self.repeat_period)
+                if ticks_diff(now, next_time) >= 0:
+                    next_time = ticks_add(now, self.repeat_period)
+                self.repeat_time[key] = next_time
+                self.repeat_count[key] += 1
+                callback(key, self.repeat_count[key], t)
+
+    async def run(self, callback, period, sleep):
+        while True:
+            self.update(callback)
+            await sleep(period)
 
@@ -0,0 +1,124 @@
+"""
+calibration.py
+
+Calibration of the potentiostat current ranges and set-point DAC.
+
+The calibration consists of a gain and an ADC offset (V) for each current
+range and a DAC offset (V) for the set-point voltage. It is stored on flash as
+a small JSON file, constants.CALIBRATION_FILE, e.g.
+
+    {"dac_offset": -0.0021, "ranges": {"100uA": [1.0032, 0.0014]}}
+
+and loaded at startup. The Potentiostat folds the calibration into
+precomputed scale and offset constants, so calibrated and uncalibrated
+measurements cost the same.
+
+To calibrate, connect a known resistive load between the working electrode
+and the counter/reference electrodes and from the REPL run
+
+    import calibration
+    from potentiostat import Potentiostat
+    pstat = Potentiostat('100uA')
+    cal = calibration.Calibration.load()
+    calibration.calibrate_range(pstat, cal, '100uA', 10.0e3)
+    cal.save()
+
+Repeat calibrate_range for each current range with a suitable load. The
+DAC offset is measured on each call from the reference electrode voltage.
+"""
+import json
+import constants
+
+
+class Calibration:
+
+    def __init__(self, ranges=None, dac_offset=0.0):
+        if ranges is None:
+            ranges = {}
+        self.ranges = ranges
+        self.dac_offset = dac_offset
+
+    def gain(self, current_range):
+        return self.ranges.get(current_range, (1.0, 0.0))[0]
+
+    def adc_offset(self, current_range):
+        return self.ranges.get(current_range, (1.0, 0.0))[1]
+
+    def set_range(self, current_range, gain, adc_offset):
+        self.ranges[current_range] = (gain, adc_offset)
+
+    @classmethod
+    def load(cls, path=None):
+        """ Loads the calibration file. Returns an identity calibration if there isn't one. """
+        if path is None:
+            path = constants.CALIBRATION_FILE
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return cls()
+        ranges = {k: tuple(v) for (k, v) in data.get('ranges', {}).items()}
+        return cls(ranges, data.get('dac_offset', 0.0))
+
+    def save(self, path=None):
+        if path is None:
+            path = constants.CALIBRATION_FILE
+        data = {
+                'dac_offset' : self.dac_offset,
+                'ranges'     : {k: list(v) for (k, v) in self.ranges.items()},
+                }
+        with open(path, 'w') as f:
+            json.dump(data, f)
+
+
+def fit_line(x, y):
+    """ Least squares fit of y = slope*x + intercept """
+    num = len(x)
+    x_mean = sum(x)/num
+    y_mean = sum(y)/num
+    sxx = sum([(xi - x_mean)**2 for xi in x])
+    sxy = sum([(xi - x_mean)*(yi - y_mean) for (xi, yi) in zip(x, y)])
+    slope = sxy/sxx
+    return slope, y_mean - slope*x_mean
+
+
+def calibrate_range(pstat, cal, current_range, load_ohm, num_points=7, fill=0.8, num_avg=10):
+    """
+    Calibrates a current range using a known resistive load.
+
+    The set-point is stepped over num_points voltages spanning +/- fill of
+    the range's full scale current through the load. At each point the
+    transimpedance amplifier and reference electrode voltages are measured
+    num_avg times. The current through the load is taken from the measured
+    reference voltage, so DAC errors don't affect the gain. The gain and ADC
+    offset of the range and the DAC offset are stored in cal, which is also
+    applied to pstat.
+    """
+    pstat.current_range = current_range
+    pstat.calibration = None
+    full_scale = pstat.vgnd/pstat.tia_resistor_ohm
+    volt_max = min(fill*full_scale*load_ohm, fill*pstat.vgnd)
+    setpts = [volt_max*(2.0*i/(num_points - 1) - 1.0) for i in range(num_points)]
+
+    load_curr = []
+    tia_volt = []
+    dac_error = []
+    pstat.connected = True
+    for setpt in setpts:
+        pstat.voltage = setpt
+        for i in range(num_avg):
+            tia, ref = pstat.measure_voltages()
+            load_curr.append(ref/load_ohm)
+            tia_volt.append(tia)
+            dac_error.append(ref - setpt)
+    pstat.voltage = 0.0
+    pstat.connected = False
+
+    # Only the magnitude of the slope is used for the gain so the sign 
+    # convention of the current is left unchanged.
+    slope, intercept = fit_line(load_curr, tia_volt)
+    cal.set_range(current_range, pstat.tia_resistor_ohm/abs(slope), intercept)
+    cal.dac_offset = -sum(dac_error)/len(dac_error)
+    pstat.calibration = cal
+    return cal
+
@@ -0,0 +1,196 @@
+import math
+
+POW10 = [10**i for i in range(9)]
+SMALL_INT_MAX = 2**29
+NEAR_TIE_MAX = 0.001  # largest rounding error at which near ties are checked
+
+# Float epsilon, 2**-52 for CPython doubles and larger for CircuitPython floats
+EPS = 1.0
+while 1.0 + 0.5*EPS != 1.0:
+    EPS *= 0.5
+MS_COLUMNS = ('t',)  # given as integer ms, stored as uint32 in binary records
+
+
+class Column:
+    """
+    Describes a column in a data file.
+
+        column = Column('curr', 'nA', scale=1000.0, precision=0)
+
+    Values are given to the schema in the app's base units (s, V, uA and C),
+    except for the time which is given as an integer number of ms (see
+    MS_COLUMNS), and are multiplied by scale before being written. The precision is the
+    number of digits after the decimal point in text files, so a precision of
+    zero together with a scale gives integer scaled units, e.g. nA or ms.
+    """
+
+    def __init__(self, name, units, scale=1.0, precision=2):
+        self.name = name
+        self.units = units
+        self.scale = scale
+        self.precision = precision
+
+
+class ColumnSchema:
+    """
+    Implements a column schema for the data files with an allocation free
+    formatter.
+
+        schema = ColumnSchema([
+            Column('t', 's', 1.0, 3),
+            Column('volt', 'V', 1.0, 3),
+            Column('curr', 'nA', 1000.0, 0),
+            ])
+
+    Rows are formatted in place into a preallocated bytearray, e.g. the
+    buffer of a BufferedWriter, which avoids allocating a string for each
+    row. Missing values are given as nan. The row, including the newline,
+    takes at most max_line bytes (for values below 1e20).
+
+        pos = schema.format_into(buf, pos, values)
+
+    The time, an integer number of ms from the start of acquisition, is
+    formatted with integer arithmetic when the column's scale and precision
+    are a whole number of ms or more per digit (e.g. s with 3 or 2 digits), so
+    it stays exact however long the run. Binary records (see record_buffer.py)
+    use the struct format binary_fmt, uint32 ms for the time and float32 for
+    the other columns, packed from the values multiplied by binary_scales.
+
+        schema.binary_fmt    # e.g. '<Iff'
+
+    The header line describes the columns in the form name:units and starts
+    with a '#' so that it is skipped as a comment by most host tools, e.g.
+    numpy.loadtxt.
+
+        # t:s volt:V curr:nA
+
+    """
+
+    def __init__(self, columns):
+        self.columns = columns
+        self.names = [column.name for column in columns]
+        self.precisions = [min(column.precision, len(POW10) - 1) for column in columns]
+        self.max_line = sum([24 + precision for precision in self.precisions])
+        self.scales = []
+        self.binary_scales = []
+        self.ms_muls = []
+        self.ms_divs = []
+        for (column, precision) in zip(columns, self.precisions):
+            mul, div = 1, 0
+            if column.name in MS_COLUMNS:
+                # Digits per ms, as an integer multiplier or divisor if possible
+                per_ms = column.scale*POW10[precision]/1000
+                if per_ms >= 1 and abs(per_ms - round(per_ms)) < 1.0e-6:
+                    mul, div = round(per_ms), 1
+                elif 0 < per_ms < 1 and abs(1/per_ms - round(1/per_ms)) < 1.0e-6:
+                    div = round(1/per_ms)
+                self.scales.append(column.scale/1000)
+                self.binary_scales.append(1)
+            else:
+                self.scales.append(column.scale)
+                self.binary_scales.append(1.0)
+            self.ms_muls.append(mul)
+            self.ms_divs.append(div)
+        self.binary_fmt = '<' + ''.join(['I' if name in MS_COLUMNS else 'f' for name in self.names])
+
+    @classmethod
+    def from_spec(cls, spec):
+        """ Creates a schema from a list of (name, units, scale, precision) tuples """
+        return cls([Column(*item) for item in spec])
+
+    def __len__(self):
+        return len(self.columns)
+
+    def format_into(self, buf, pos, values):
+        """ 
+        Formats a row of values (a list, with nan for missing values) into the
+        bytearray buf at pos followed by a newline. Returns the new position.
+        """
+        scales = self.scales
+        precisions = self.precisions
+        ms_muls = self.ms_muls
+        ms_divs = self.ms_divs
+        last = len(values) - 1
+        for i in range(len(values)):
+            value = values[i]
+            div = ms_divs[i]
+            if div and value >= 0:
+                pos = format_int(buf, pos, (value*ms_muls[i] + div//2)//div, precisions[i])
+            else:
+                pos = format_fixed(buf, pos, value*scales[i], precisions[i])
+            buf[pos] = 10 if i == last else 32
+            pos += 1
+        return pos
+
+    def describe(self):
+        return ' '.join([f'{column.name}:{column.units}' for column in self.columns])
+
+    def binary_describe(self):
+        """ As describe, for binary records, in which the time is in ms """
+        return ' '.join([f'{column.name}:{"ms" if column.name in MS_COLUMNS else column.units}' for column in self.columns])
+
+    def header(self):
+        return f'# {self.describe()}'
+
+
+def format_fixed(buf, pos, value, precision):
+    """
+    Writes value with precision digits after the decimal point into the
+    bytearray buf at pos and returns the new position. Only small integers
+    are used, so nothing is allocated, except for values too large for them
+    and values within rounding error of a tie, which are formatted with
+    str.format. The output then matches str.format whenever the scaled value
+    is known to better than NEAR_TIE_MAX, always the case for doubles. With
+    single precision floats larger values are rounded half to even from the
+    scaled value, so the last digit can be off by one.
+    """
+    if value != value:
+        buf[pos] = 110  # nan
+        buf[pos + 1] = 97
+        buf[pos + 2] = 110
+        return pos + 3
+    if value < 0 or (value == 0 and math.copysign(1.0, value) < 0):
+        buf[pos] = 45  # -
+        pos += 1
+        value = -value
+    scaled = value*POW10[precision]
+    n = int(scaled) if scaled < SMALL_INT_MAX else 0
+    frac = scaled - n
+    # The product is rounded by at most scaled*EPS, so only values that close
+    # to a tie need the exact value to decide which way to round
+    tol = scaled*EPS
+    if scaled >= SMALL_INT_MAX or (tol < NEAR_TIE_MAX and -tol <= frac - 0.5 <= tol):
+        text = '{:.{}f}'.format(value, precision).encode()
+        for i in range(len(text)):
+            buf[pos + i] = text[i]
+        return pos + len(text)
+    if frac > 0.5 or (frac == 0.5 and n%2):
+        n += 1
+    return format_int(buf, pos, n, precision)
+
+
+def format_int(buf, pos, n, precision):
+    """
+    Writes the non-negative integer n, a number of units of 10**-precision,
+    with precision digits after the decimal point into the bytearray buf at pos and returns
+    the new position.
+    """
+    num_int = 1
+    m = n//POW10[precision]
+    while m >= 10:
+        m //= 10
+        num_int += 1
+    end = pos + num_int + (precision + 1 if precision else 0)
+    i = end - 1
+    for k in range(precision):
+        buf[i] = 48 + n%10
+        n //= 10
+        i -= 1
+    if precision:
+        buf[i] = 46  # .
+        i -= 1
+    while i >= pos:
+        buf[i] = 48 + n%10
+        n //= 10
+        i -= 1
+    return end
@@ -1,8 +1,25 @@
 import time
 import utils
+from adafruit_ticks import ticks_ms, ticks_add, ticks_diff
+try:
+    import asyncio
+except ImportError:
+    asyncio = None
+try:
+    import usb_cdc
+except ImportError:
+    usb_cdc = None
 import constants
+import profiler
+from scheduler import Scheduler
 from data_logger import DataLogger
+from data_stream import DataStream
+from sample_record import SampleRecord
 from potentiostat import Potentiostat
+from decimation_filter import FilterChain
+from autorange import AutoRanger
+from calibration import Calibration
+from waveform import Waveform
 from button_monitor import ButtonMonitor
 from battery_monitor import BatteryMonitor
 from const_volt_display import ConstVoltDisplay
@@ -37,109 +54,264 @@ class ConstVoltApp:
 
     BUTTON_SETPT_INCR (currently the up arrow key on the pybadge)
 
-        Increases the set-point voltage by SETPT_VOLT_STEP. 
+        Increases the set-point voltage by SETPT_VOLT_STEP. Holding the button
+        repeats the step and, after a long press, ramps the set-point in steps
+        of SETPT_VOLT_FAST_STEP.
 
     BUTTON_SETPT_DECR (currently the down arrow key on the pybadge)
 
-        Decreases the set-point voltage by SETPT_VOLT_STEP 
+        Decreases the set-point voltage by SETPT_VOLT_STEP. Repeats when held
+        as for BUTTON_SETPT_INCR.
 
     BUTTON_CLEAR_FILES (currently button A on the pybadge)
 
         Clears/erases all data files on the device. 
+
+    If constants.WAVEFORM is set the set-point voltage follows the given
+    waveform, which is precomputed as DAC codes, from the start of acquisition
+    instead of the set-point buttons.
+
+    If constants.STREAM_ENABLED is set the data is also streamed live over
+    the USB serial data port (see data_stream.py), in which case the flash
+    storage can be left read-only for circuitpython.
+
+    The app is run as a set of cooperating asyncio tasks: acquisition, buttons,
+    temperature sensor, battery monitor and display. Acquisition runs every
+    SAMPLE_DT seconds and the battery monitor and display at their own slower
+    rates (BATTERY_DT and DISPLAY_MAX_FPS). Between deadlines each task awaits, so
+    acquisition only gives up time when it has nothing to do. The button task
+    drains the keypad event queue every BUTTON_DT seconds and the temperature
+    task awaits the DS18B20 conversion delay. 
+
+    If the asyncio library isn't installed the same tasks are run by a deadline
+    based scheduler in a single loop, with the temperature sensor polled every
+    TEMP_SENSOR_DT seconds. 
+
+    The task statistics, including missed deadlines (overruns), are printed
+    to the serial console when acquisition is stopped, as are the profiler
+    statistics if constants.PROFILER_ENABLED is True (see profiler.py).
  
     """
 
     def __init__(self):
         self.running = False
         self.t_start = 0.0
+        self.t = 0.0
+        self.t_ms = 0
+        self.ticks_prev = 0
+        self.curr_ua = None
         self.read_only = utils.is_read_only()
         self.setpt_voltage = constants.DEFAULT_SETPT_VOLT 
-        self.pstat = Potentiostat(constants.CURRENT_RANGE)
+        self.volt = self.setpt_voltage
+        tia_filter = None
+        if constants.TIA_FILTER:
+            tia_filter = FilterChain.from_spec(constants.TIA_FILTER)
+        self.pstat = Potentiostat(
+                constants.CURRENT_RANGE, 
+                tia_filter=tia_filter, 
+                oversample=constants.TIA_OVERSAMPLE,
+                range_pins=constants.CURRENT_RANGE_SELECT_PINS,
+                calibration=Calibration.load(),
+                buffered=constants.TIA_BUFFERED,
+                sample_rate=constants.TIA_SAMPLE_RATE,
+                )
+        self.autoranger = None
+        if constants.AUTORANGE_ENABLED:
+            self.autoranger = AutoRanger(
+                    self.pstat, 
+                    high=constants.AUTORANGE_HIGH, 
+                    low=constants.AUTORANGE_LOW, 
+                    settle=constants.AUTORANGE_SETTLE,
+                    )
         self.pstat.connected = False
-        self.button_monitor = ButtonMonitor()
+        self.waveform = None
+        if constants.WAVEFORM:
+            self.waveform = Waveform.from_spec(constants.WAVEFORM, constants.SAMPLE_DT, self.pstat)
+        self.button_monitor = ButtonMonitor(
+                repeat_keys=(constants.BUTTON_SETPT_INCR, constants.BUTTON_SETPT_DECR),
+                repeat_delay=constants.BUTTON_REPEAT_DELAY,
+                repeat_period=constants.BUTTON_REPEAT_DT,
+                )
         self.battery_monitor = BatteryMonitor()
         self.data_logger = DataLogger(self.read_only)
         self.temperature_sensor = TemperatureSensor()
+        self.sample = SampleRecord(self.data_logger.data_schema)
+        self.stream = None
+        if constants.STREAM_ENABLED and usb_cdc is not None and usb_cdc.data is not None:
+            usb_cdc.data.write_timeout = constants.STREAM_WRITE_TIMEOUT
+            self.stream = DataStream(
+                    usb_cdc.data, 
+                    self.data_logger.data_schema, 
+                    constants.STREAM_BATCH_SIZE,
+                    )
 
         self.display = ConstVoltDisplay()
         self.display.set_running(False)
         self.display.set_time(0.0)
-        self.display.set_volt(self.setpt_voltage)
+        self.display.set_volt(self.volt)
         self.display.set_curr(0.0)
         self.button_to_action = {
                 constants.BUTTON_START       : self.on_button_start, 
                 constants.BUTTON_STOP        : self.on_button_stop, 
+                constants.BUTTON_CLEAR_FILES : self.on_button_clear_files, 
+                }
+        self.button_to_repeat_action = {
                 constants.BUTTON_SETPT_INCR  : self.on_button_setpt_incr, 
                 constants.BUTTON_SETPT_DECR  : self.on_button_setpt_decr, 
-                constants.BUTTON_CLEAR_FILES : self.on_button_clear_files, 
                 }
 
+        self.scheduler = Scheduler()
+        self.scheduler.add_task('acquire', self.acquire, constants.SAMPLE_DT)
+        if asyncio is None:
+            self.scheduler.add_task('button', self.handle_button_press, constants.BUTTON_DT)
+            self.scheduler.add_task('temperature', self.temperature_sensor.update, constants.TEMP_SENSOR_DT)
+        self.scheduler.add_task('battery', self.battery_monitor.update, constants.BATTERY_DT)
+        self.scheduler.add_task('display', self.update_display, 1.0/constants.DISPLAY_MAX_FPS)
+
     def handle_button_press(self):
-        button = self.button_monitor.events
-        if button is None:
-            return
-        try:
+        self.button_monitor.update(self.on_button)
+
+    def on_button(self, button, repeat=0, t=None):
+        if button in self.button_to_repeat_action:
+            self.button_to_repeat_action[button](repeat)
+        elif button in self.button_to_action:
             self.button_to_action[button]()
-        except KeyError:
-            pass
 
     def on_button_start(self): 
         self.pstat.connected = True
-        self.pstat.voltage = self.setpt_voltage
-        self.t_start = time.monotonic()
+        if self.waveform is None:
+            self.set_voltage(self.setpt_voltage)
+        else:
+            self.waveform.reset()
+            self.set_waveform_voltage(0)
+        # Samples stay on the acquire task's existing deadline grid, as the
+        # asyncio task is already sleeping towards its next deadline
+        self.t_start = self.scheduler.next_deadline('acquire')
+        # The sample times are counted in integer ms from the ms ticks, so
+        # they don't lose resolution on long runs as the float monotonic
+        # time does, and small ints don't allocate
+        self.t_ms = 0
+        self.ticks_prev = ticks_add(ticks_ms(), int(1000*(self.t_start - time.monotonic())))
         self.running = True
         self.data_logger.start()
+        if self.stream is not None:
+            self.stream.start()
         self.display.set_running(True)
+        self.scheduler.reset_task('acquire', self.t_start)
 
     def on_button_stop(self):
         self.pstat.connected = False
         self.pstat.voltage = 0.0
+        self.volt = self.setpt_voltage
         self.running = False
         self.data_logger.stop()
+        if self.stream is not None:
+            self.stream.flush()
         self.display.set_running(False)
+        self.scheduler.report()
+        if constants.PROFILER_ENABLED:
+            profiler.dump(None if self.read_only else constants.PROFILER_FILE)
+            profiler.reset()
+
+    def setpt_step(self, repeat):
+        if repeat >= constants.BUTTON_FAST_REPEATS:
+            return constants.SETPT_VOLT_FAST_STEP
+        return constants.SETPT_VOLT_STEP
 
-    def on_button_setpt_incr(self):
-        self.setpt_voltage += constants.SETPT_VOLT_STEP
+    def on_button_setpt_incr(self, repeat=0):
+        self.setpt_voltage += self.setpt_step(repeat)
         self.setpt_voltage = min(self.setpt_voltage, constants.SETPT_VOLT_MAXVAL)
+        self.on_setpt_change()
 
-    def on_button_setpt_decr(self):
-        self.setpt_voltage -= constants.SETPT_VOLT_STEP
+    def on_button_setpt_decr(self, repeat=0):
+        self.setpt_voltage -= self.setpt_step(repeat)
         self.setpt_voltage = max(self.setpt_voltage, constants.SETPT_VOLT_MINVAL)
+        self.on_setpt_change()
+
+    def on_setpt_change(self):
+        if self.running:
+            if self.waveform is None:
+                self.set_voltage(self.setpt_voltage)
+        else:
+            self.volt = self.setpt_voltage
+
+    def set_voltage(self, volt):
+        self.pstat.voltage = volt
+        self.volt = volt
+
+    def set_waveform_voltage(self, index):
+        code, self.volt = self.waveform.lookup(index)
+        self.pstat.write_dac_code(code, self.volt)
 
     def on_button_clear_files(self):
         if not self.running:
             self.file_count = 0
             self.data_logger.reset()
 
-    def run(self):
-        while True:
-            self.handle_button_press()
-            
-            self.battery_monitor.update()
-            self.temperature_sensor.update()
-
-            self.display.set_volt(self.setpt_voltage)
-            self.display.set_mode(self.read_only)
-            self.display.set_file(self.data_logger.data_file_name)
-            self.display.set_vbat(self.battery_monitor.voltage_lowpass)
-            self.display.set_temp(self.temperature_sensor.value)
-
-            if self.running:
-                t = time.monotonic() - self.t_start
-                self.pstat.voltage = self.setpt_voltage
-                curr_ua = utils.convert_a_to_ua(self.pstat.current)
-                self.display.set_time(t)
-                self.display.set_curr(curr_ua)
-                data = {
-                        't'    : t, 
-                        'volt' : self.setpt_voltage, 
-                        'curr' : curr_ua, 
-                        'temp' : self.temperature_sensor.value, 
-                        }
-                self.data_logger.update(data)
-            else:
-                self.display.set_time(0.0)
-                self.display.set_curr(None)
+    @profiler.profile('app.acquire')
+    def acquire(self):
+        if not self.running:
+            return
+        now = time.monotonic()
+        ticks = ticks_ms()
+        self.t_ms += ticks_diff(ticks, self.ticks_prev)
+        self.ticks_prev = ticks
+        self.t = 0.001*self.t_ms
+        if self.waveform is not None:
+            self.set_waveform_voltage(int(self.t/constants.SAMPLE_DT + 0.5))
+        with_ref = constants.REF_IN_DATA_FILE
+        full_scale = None
+        ref_voltage = None
+        if self.autoranger is not None:
+            curr, ref_voltage = self.autoranger.measure(with_ref)
+            full_scale = self.autoranger.full_scale
+        elif with_ref:
+            curr, ref_voltage = self.pstat.measure()
+        else:
+            curr = self.pstat.current
+        self.curr_ua = utils.convert_a_to_ua(curr)
+        temp = self.temperature_sensor.value_at(now)
+        sample = self.sample
+        sample['t'] = self.t_ms
+        sample['volt'] = self.volt
+        sample['curr'] = self.curr_ua
+        sample['temp'] = temp
+        sample['range'] = full_scale
+        sample['ref'] = ref_voltage
+        self.data_logger.update(sample, temp)
+        if self.stream is not None:
+            self.stream.update(sample)
+        if self.waveform is not None and self.waveform.done and constants.WAVEFORM_STOP_AT_END:
+            self.on_button_stop()
 
+    @profiler.profile('app.update_display')
+    def update_display(self):
+        self.display.set_volt(self.volt)
+        self.display.set_mode(self.read_only)
+        self.display.set_file(self.data_logger.data_file_name)
+        self.display.set_vbat(self.battery_monitor.voltage_lowpass)
+        self.display.set_temp(self.temperature_sensor.value)
+        if self.running:
+            self.display.set_time(self.t)
+            self.display.set_curr(self.curr_ua)
+        else:
+            self.display.set_time(0.0)
+            self.display.set_curr(None)
+        self.display.refresh()
+
+    def run(self):
+        if asyncio is None:
+            self.scheduler.run()
+        else:
+            asyncio.run(self.main())
 
+    async def main(self):
+        tasks = [
+                self.scheduler.run_task('acquire', asyncio.sleep),
+                self.button_monitor.run(self.on_button, constants.BUTTON_DT, asyncio.sleep),
+                self.temperature_sensor.run(asyncio.sleep),
+                self.scheduler.run_task('battery', asyncio.sleep),
+                self.scheduler.run_task('display', asyncio.sleep),
+                ]
+        await asyncio.gather(*[asyncio.create_task(task) for task in tasks])
 
@@ -2,6 +2,7 @@ import time
 import board
 import displayio
 import constants
+import profiler
 from adafruit_bitmap_font import bitmap_font
 from adafruit_display_text import label
 from adafruit_display_shapes import circle
@@ -13,9 +14,29 @@ class ConstVoltDisplay:
 
     """
     Implements the display for the constant voltage example app. 
+
+    The last value and text shown for each field are cached. The set methods
+    return without formatting when the value hasn't changed, and label text is
+    only assigned, which re-lays out the glyphs and marks the label dirty, when
+    the formatted text has changed. 
+
+    When constants.DISPLAY_AUTO_REFRESH is False the display is only refreshed
+    by calling the refresh method, so that all the label changes made since the
+    last frame are sent over SPI in a single refresh at a time chosen by the
+    caller, e.g. the app's display task which runs at DISPLAY_MAX_FPS.
+
+        display.refresh()
+
+    The time taken by the last refresh and the maximum time taken are
+    available as display.frame_time and display.frame_time_max (s). 
     """
 
     def __init__(self):
+        self.values = {}
+        self.dirty = True
+        self.frame_count = 0
+        self.frame_time = 0.0
+        self.frame_time_max = 0.0
         board.DISPLAY.brightness = 1.0
         font = bitmap_font.load_font(constants.FONT_FILE)
         
@@ -136,59 +157,105 @@ class ConstVoltDisplay:
         self.group.append(self.mode_label)
         self.group.append(self.file_label)
         board.DISPLAY.root_group = self.group
+        board.DISPLAY.auto_refresh = constants.DISPLAY_AUTO_REFRESH
+
+    def value_changed(self, field, value):
+        """ Returns True, and caches the new value, if value differs from the cached value """
+        if field in self.values and self.values[field] == value:
+            return False
+        self.values[field] = value
+        return True
+
+    def set_text(self, label, text):
+        if label.text != text:
+            label.text = text
+            self.dirty = True
+
+    @profiler.profile('display.refresh')
+    def refresh(self):
+        """ 
+        Refreshes the display if any labels have changed since the last refresh.
+        Returns True if the display was refreshed. No target frame rate is given
+        to displayio, which would sleep inside refresh to hold it, as the frame
+        rate is set by how often the caller refreshes. 
+        """
+        if board.DISPLAY.auto_refresh or not self.dirty:
+            return False
+        t0 = time.monotonic_ns()
+        refreshed = board.DISPLAY.refresh(minimum_frames_per_second=0)
+        if refreshed:
+            self.dirty = False
+            self.frame_count += 1
+            self.frame_time = 1.0e-9*(time.monotonic_ns() - t0)
+            self.frame_time_max = max(self.frame_time, self.frame_time_max)
+        return refreshed
 
     def set_running(self, value):
+        if not self.value_changed('running', value):
+            return
         if value:
             text = f'{constants.STATE_STR}   {constants.RUNNING_STR}'
         else:
             text = f'{constants.STATE_STR}   {constants.STOPPED_STR}'
-        self.running_label.text = text
+        self.set_text(self.running_label, text)
+
     def set_time(self, t):
-        self.time_label.text = f'{constants.TIME_STR}  {t:6.0f}s'
+        if not self.value_changed('time', t):
+            return
+        self.set_text(self.time_label, f'{constants.TIME_STR}  {t:6.0f}s')
 
     def set_volt(self, volt):
+        if not self.value_changed('volt', volt):
+            return
         if volt is not None:
             text = f'{constants.VOLT_STR} {volt:7.2f}V'
         else:
             text = f'{constants.VOLT_STR}    {constants.NONE_STR}'
-        self.volt_label.text = text
+        self.set_text(self.volt_label, text)
 
     def set_curr(self, curr):
+        if not self.value_changed('curr', curr):
+            return
         if curr is not None:
             text = f'{constants.CURR_STR} {curr:7.2f}uA'
         else:
             text = f'{constants.CURR_STR}    {constants.NONE_STR}'
-        self.curr_label.text = text
+        self.set_text(self.curr_label, text)
 
     def set_temp(self, temp):
         if constants.TEMP_SENSOR_ENABLED:
+            if not self.value_changed('temp', temp):
+                return
             if temp is not None:
                 text = f'{constants.TEMP_STR}  {temp:7.2f}C'
             else:
                 text = f'{constants.TEMP_STR}    {constants.NONE_STR}'
-            self.temp_label.text = text
+            self.set_text(self.temp_label, text)
 
     def set_vbat(self, volt):
+        if not self.value_changed('vbat', volt):
+            return
         if volt is not None:
             text = f'{constants.VBAT_STR} {volt:7.2f}V'
         else:
             text = f'{constants.VBAT_STR}    {constants.NONE_STR}'
-        self.vbat_label.text = text
+        self.set_text(self.vbat_label, text)
 
     def set_mode(self, readonly):
+        if not self.value_changed('mode', readonly):
+            return
         if readonly:
             text = f'{constants.MODE_STR}    {constants.READ_ONLY_STR}'
         else:
             text = f'{constants.MODE_STR}    {constants.READ_WRITE_STR}'
-        self.mode_label.text = text
+        self.set_text(self.mode_label, text)
 
     def set_file(self, name):
+        if not self.value_changed('file', name):
+            return
         if name is None:
             text = f'{constants.FILE_STR}    {constants.NONE_STR}'
         else:
             text = f'{constants.FILE_STR}    {name}'
-        self.file_label.text = text
-
-
-
+        self.set_text(self.file_label, text)
 
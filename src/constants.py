@@ -1,10 +1,65 @@
 # Voltage and current 
 CURRENT_RANGE = '100uA'
+
+# Optional decimation filter chain for the current measurement (see
+# decimation_filter.py). When None the current is a mean of the samples. 
+# Otherwise each measurement oversamples the TIA channel TIA_OVERSAMPLE times 
+# and filters it with the given stages, e.g. [('cic', 4, 3), ('mains', 60.0)]. 
+# With a 'mains' stage TIA_OVERSAMPLE has to span at least one mains period,
+# ideally a whole number, at the ADC sampling rate (pstat.ain_sample_rate), or
+# ValueError is raised at startup. 
+TIA_FILTER = None 
+TIA_OVERSAMPLE = 512
+
+# Buffered acquisition of the TIA channel with analogbufio.BufferedIn, on
+# boards which have it (e.g. RP2040). Each measurement reads its block of
+# samples in one call at TIA_SAMPLE_RATE samples/s. 
+TIA_BUFFERED = False
+TIA_SAMPLE_RATE = 100000
+
+# Calibration file (see calibration.py) loaded at startup if present
+CALIBRATION_FILE = 'calibration.json'
+
+# Automatic current range selection (see autorange.py). Requires a board with
+# switchable TIA resistors. CURRENT_RANGE_SELECT_PINS maps each current range
+# to the board pin of the digital output selecting it, e.g. {'1uA': 'D5', 
+# '10uA': 'D6', '100uA': 'D9', '1000uA': 'D10'}, and a ValueError is raised at
+# startup without a pin for every range. When enabled the active range is
+# logged in the data file range column (full scale uA). 
+AUTORANGE_ENABLED = False
+CURRENT_RANGE_SELECT_PINS = None
+AUTORANGE_HIGH = 0.90    # switch up above this fraction of full scale
+AUTORANGE_LOW = 0.08     # switch down below this fraction of full scale
+AUTORANGE_SETTLE = 3     # measurements discarded after a range change
 DEFAULT_SETPT_VOLT = 0.5
 SETPT_VOLT_STEP    = 0.05
 SETPT_VOLT_MAXVAL  = 1.6
 SETPT_VOLT_MINVAL  = -1.6
 
+# Holding the set-point buttons repeats the step every BUTTON_REPEAT_DT
+# seconds after BUTTON_REPEAT_DELAY seconds. After BUTTON_FAST_REPEATS repeats
+# (a long press) the step increases to SETPT_VOLT_FAST_STEP.
+BUTTON_REPEAT_DELAY = 0.5
+BUTTON_REPEAT_DT = 0.1
+BUTTON_FAST_REPEATS = 10
+SETPT_VOLT_FAST_STEP = 0.25
+
+# Optional set-point voltage waveform (see waveform.py). When None the
+# set-point is constant and set with the buttons. Otherwise one of
+#   ('steps', [(duration, volt), ...])
+#   ('staircase', volt_start, volt_stop, volt_step, step_duration)
+#   ('pulse', volt_base, volt_pulse, period, width, count)
+# with durations in seconds. Requires SAMPLE_DT > 0. 
+WAVEFORM = None 
+WAVEFORM_STOP_AT_END = True   # stop acquisition at the end of the waveform
+
+# Task scheduling periods (s)
+SAMPLE_DT = 0.05
+BUTTON_DT = 0.02
+DISPLAY_MAX_FPS = 4.0
+BATTERY_DT = 1.0
+TEMP_SENSOR_DT = 0.1
+
 # Temperature sensor
 TEMP_SENSOR_ENABLED = False 
 TEMP_SENSOR_RESOLUTION = 12 # 9, 10, 11 or 12 
@@ -13,11 +68,65 @@ TEMP_SENSOR_SCHEDULE = [
         (20.0, 30.0),  # window #2 (t_start, t_stop) 
         ]              # ... etc
 
+# Periodic windows can be given compactly as ('periodic', t_start, period,
+# width, count), e.g. a 5s window every minute for 100 minutes from t=60s
+#   TEMP_SENSOR_SCHEDULE = [('periodic', 60.0, 60.0, 5.0, 100)]
+# See temp_schedule.py.
+
 # Data logging
 DATA_FILES_DIR = 'data_files'
 DATA_FILE_PREFIX = 'data'
 TEMP_FILE_PREFIX = 'temp'
 TEMP_IN_DATA_FILE = False 
+REF_IN_DATA_FILE = False      # log the measured reference electrode voltage
+DATA_FILE_FORMAT = 'text'     # 'text' or 'binary'
+DATA_FILE_HEADER = True       # write '# name:units ...' header line to text files
+DATA_MANIFEST_FILE = 'manifest.txt'  # last data file number, in DATA_FILES_DIR
+
+# Data file segments. When either limit is set each run is split into segment
+# files data{N}_1.txt, data{N}_2.txt, ... etc. which are rolled over before a
+# record would take the segment past DATA_SEGMENT_MAX_SIZE bytes, or when it
+# reaches DATA_SEGMENT_MAX_DT seconds. 
+DATA_SEGMENT_MAX_SIZE = None 
+DATA_SEGMENT_MAX_DT = None 
+
+# Data file columns (name, units, scale, precision). Values are scaled from
+# the base units s, V, uA and C, e.g. ('curr', 'nA', 1000.0, 0) writes the
+# current as an integer number of nA. The temp, range and ref columns are only 
+# written when TEMP_IN_DATA_FILE, AUTORANGE_ENABLED and REF_IN_DATA_FILE 
+# respectively are True.
+DATA_FILE_COLUMNS = [
+        ('t',    's',  1.0, 3),
+        ('volt', 'V',  1.0, 3),
+        ('curr', 'uA', 1.0, 4),
+        ('temp', 'C',  1.0, 2),
+        ('range', 'uA', 1.0, 0),
+        ('ref',  'V',  1.0, 4),
+        ]
+TEMP_FILE_COLUMNS = [
+        ('t',        's', 1.0, 2),
+        ('temp',     'C', 1.0, 2),
+        ('temp_avg', 'C', 1.0, 2),
+        ]
+BINARY_BUFFER_SIZE = 2048     # bytes of records buffered in RAM per flash write
+BINARY_HEADER_SIZE = 64       # bytes, header is padded to this size
+DATA_BUFFER_SIZE = 1024       # bytes of text buffered in RAM per flash write
+DATA_FLUSH_DT = 5.0           # maximum time (s) between flushes
+DATA_SYNC_DT = 10.0           # minimum time (s) between filesystem syncs
+
+# Live streaming of the data over the USB serial data port, usb_cdc.data (see
+# data_stream.py and host/stream_receiver.py). The data port is enabled in
+# boot.py, so changes take effect after a hard reset. Records are sent in 
+# frames of STREAM_BATCH_SIZE records (1-255). 
+STREAM_ENABLED = False
+STREAM_BATCH_SIZE = 16
+STREAM_WRITE_TIMEOUT = 0.01   # maximum time (s) a frame write may block
+
+# Profiler. When enabled the statistics are printed to the serial console
+# when acquisition is stopped, or written to PROFILER_FILE if it isn't None
+# and the flash is read-write.
+PROFILER_ENABLED = False
+PROFILER_FILE = None 
 
 # Button assignments
 BUTTON_STOP = 3
@@ -42,6 +151,10 @@ NONE_STR = 'NONE'
 READ_ONLY_STR = 'READ-ONLY'
 READ_WRITE_STR = 'READ-WRITE'
 
+# Display refresh. When auto refresh is off the display is only refreshed by
+# the display task, so SPI transfers stay out of the acquisition window.
+DISPLAY_AUTO_REFRESH = False
+
 # Display font and colors
 FONT_FILE = 'Hack-Bold-10.pcf'
 TEXT_COLOR = 'orange'
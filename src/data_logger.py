@@ -1,7 +1,20 @@
 import os
 import utils
+import profiler
 import constants
-from running_average import RunningAverage
+from record_buffer import RecordBuffer
+from buffered_writer import BufferedWriter
+from column_schema import ColumnSchema
+from temp_schedule import TempSchedule
+from sample_record import NAN
+
+BINARY_MAGIC = 'RFWCV'
+BINARY_VERSION = 2
+
+
+def binary_header_text(schema):
+    """ Returns the binary data file header text, also sent by DataStream.start """
+    return f'{BINARY_MAGIC} {BINARY_VERSION} {schema.binary_fmt} {schema.binary_describe()}'
 
 
 class DataLogger:
@@ -29,12 +42,65 @@ class DataLogger:
 
         data_logger.stop()
 
-    On creation the data logger will look for files in the constants.DATA_FILES_DIR 
-    directory and use the number of files present to initialize the current file_count.
+    The number of the last file created is kept in the manifest file 
+    constants.DATA_MANIFEST_FILE in the constants.DATA_FILES_DIR directory, so
+    on creation the data logger reads file_count from it without listing the
+    directory. If the manifest is missing or unreadable file_count is set to
+    the highest file number found in the directory instead.
 
     The files in the constants.DATA_FILES_DIR directory and be deleted using 
     the "reset" method. This will also reset the file_count to zero.
 
+    If constants.DATA_SEGMENT_MAX_SIZE (bytes) or constants.DATA_SEGMENT_MAX_DT
+    (seconds) is set each run is split into segment files
+
+        {DATA_FILE_PREFIX}{N}_1.txt
+        {DATA_FILE_PREFIX}{N}_2.txt
+        ...
+        etc
+
+    and a new segment is started before the record which would take the
+    current one past DATA_SEGMENT_MAX_SIZE, or when it reaches
+    DATA_SEGMENT_MAX_DT. The size check allows for the largest possible text
+    row (ColumnSchema.max_line), so text segments usually end somewhat below
+    the limit. The first record of a segment is always written, so only a
+    limit smaller than the header plus one row can be exceeded. Each segment
+    starts with the file header, so segments can be read on their own. The
+    temperature file isn't segmented.
+
+    When constants.DATA_FILE_FORMAT is 'binary' the data files have the 
+    extension .bin and samples are written as packed little-endian records,
+    uint32 ms for the time and float32 for the other columns (see
+    ColumnSchema.binary_fmt). Records are packed into a preallocated RAM
+    buffer of constants.BINARY_BUFFER_SIZE bytes which is written to flash
+    when full. The file starts with a text header, padded with spaces to
+    BINARY_HEADER_SIZE bytes, giving the struct format of the records and the
+    column names and units, e.g.
+
+        RFWCV 2 <Iff t:ms volt:V curr:uA
+
+    The columns, their units, scaling and text precision are given by the
+    column schemas constants.DATA_FILE_COLUMNS and constants.TEMP_FILE_COLUMNS.
+    If constants.DATA_FILE_HEADER is True text files start with a header line
+    describing the columns, e.g.
+
+        # t:s volt:V curr:uA
+
+    Missing temperature values are written as nan. The optional temp, range and
+    ref columns are only written when constants.TEMP_IN_DATA_FILE, 
+    constants.AUTORANGE_ENABLED and constants.REF_IN_DATA_FILE respectively
+    are True.
+
+    Writes to the data and temperature files go through a BufferedWriter which
+    accumulates up to constants.DATA_BUFFER_SIZE bytes in RAM. The buffers are
+    flushed at least every constants.DATA_FLUSH_DT seconds and the filesystem
+    is synced at most every constants.DATA_SYNC_DT seconds, which bounds the 
+    data lost in a power cut to about DATA_FLUSH_DT + DATA_SYNC_DT seconds. The amount of data buffered is available as
+
+        data_logger.buffered
+
+    and flush statistics from data_logger.data_fid and data_logger.temp_fid.
+
     """
 
     def __init__(self, read_only):
@@ -46,9 +112,27 @@ class DataLogger:
         self.temp_file_name = None
         self.temp_file_path = None
         self.file_count = 0
+        self.segment = 0
+        self.segment_t_start = None
+        self.segmented = constants.DATA_SEGMENT_MAX_SIZE is not None or constants.DATA_SEGMENT_MAX_DT is not None
+        data_columns = [item for item in constants.DATA_FILE_COLUMNS if self.column_enabled(item[0])]
+        self.data_schema = ColumnSchema.from_spec(data_columns)
+        self.temp_schema = ColumnSchema.from_spec(constants.TEMP_FILE_COLUMNS)
+        self.binary = constants.DATA_FILE_FORMAT == 'binary'
+        if self.binary:
+            self.record_buffer = RecordBuffer(
+                    self.data_schema.binary_fmt, 
+                    constants.BINARY_BUFFER_SIZE,
+                    )
+            # Raises now, rather than at the first start, if the header doesn't fit
+            self.binary_header()
+            self.row_max_size = self.record_buffer.record_size
+        else:
+            self.row_max_size = self.data_schema.max_line
         self.create_data_dir()
         self.init_file_count()
-        self.temp_averages = [RunningAverage() for _ in constants.TEMP_SENSOR_SCHEDULE]
+        self.temp_schedule = TempSchedule.from_spec(constants.TEMP_SENSOR_SCHEDULE)
+        self.temp_values = [NAN]*len(self.temp_schema)
 
     def __del__(self):
         os.sync()
@@ -59,28 +143,48 @@ class DataLogger:
 
     @utils.if_read_write
     def init_file_count(self):
-        """ Checks for existing data files and sets file_count. """
-        self.file_count = 0
+        """ Sets file_count from the manifest or, failing that, the existing data files. """
+        try:
+            with open(self.manifest_path) as f:
+                self.file_count = int(f.read())
+        except (OSError, ValueError):
+            self.file_count = self.find_file_count()
+            self.save_file_count()
+
+    def find_file_count(self):
+        """ Returns the highest data or temperature file number in the data directory """
+        file_count = 0
         for item in os.listdir(constants.DATA_FILES_DIR):
-            if constants.DATA_FILE_PREFIX in item:
-                self.incr_file()
+            for prefix in (constants.DATA_FILE_PREFIX, constants.TEMP_FILE_PREFIX):
+                if item.startswith(prefix):
+                    number = item[len(prefix):].split('.')[0].split('_')[0]
+                    if number.isdigit():
+                        file_count = max(file_count, int(number))
+        return file_count
+
+    def save_file_count(self):
+        with open(self.manifest_path, 'w') as f:
+            f.write(f'{self.file_count}\n')
+
+    @property
+    def manifest_path(self):
+        return f'{constants.DATA_FILES_DIR}/{constants.DATA_MANIFEST_FILE}'
 
     @utils.if_read_write
     def start(self):
         """ Increments file count and starts data logging """
         self.incr_file()
-        self.data_fid = open(self.data_file_path, 'w')
-        if constants.TEMP_SENSOR_ENABLED and constants.TEMP_SENSOR_SCHEDULE:
-            self.temp_fid = open(self.temp_file_path, 'w')
-            for average in self.temp_averages:
-                average.reset()
+        self.open_data_file()
+        if constants.TEMP_SENSOR_ENABLED and len(self.temp_schedule):
+            self.temp_fid = self.open_buffered(self.temp_file_path, 'wb')
+            if constants.DATA_FILE_HEADER:
+                self.write_temp(self.temp_schema.header())
+            self.temp_schedule.reset()
 
     @utils.if_read_write
     def stop(self):
         """ Stops data logging """
-        if self.data_fid is not None:
-            self.data_fid.close()
-            self.data_fid = None
+        self.close_data_file()
         if self.temp_fid is not None:
             self.temp_fid.close()
             self.temp_fid = None
@@ -94,6 +198,7 @@ class DataLogger:
         for file_name in os.listdir(constants.DATA_FILES_DIR):
             os.unlink(f'{constants.DATA_FILES_DIR}/{file_name}')
         self.file_count = 0
+        self.save_file_count()
         self.data_file_name = constants.NONE_STR 
         self.temp_file_name = constants.NONE_STR
         os.sync()
@@ -103,16 +208,121 @@ class DataLogger:
         if self.data_fid is not None:
             self.data_fid.write(f'{msg}\n')
 
+    def write_values(self, fid, schema, values):
+        """ Formats a row of values in place into the file's buffer """
+        pos = fid.reserve(schema.max_line)
+        fid.commit(schema.format_into(fid.buffer, pos, values))
+
+    def write_record(self, values):
+        if self.data_fid is not None:
+            self.record_buffer.append_values(self.data_fid, values, self.data_schema.binary_scales)
+            if self.data_fid.flush_due():
+                self.record_buffer.flush(self.data_fid)
+
     @utils.if_read_write
     def write_temp(self,msg):
         if constants.TEMP_SENSOR_ENABLED:
             if self.temp_fid is not None:
                 self.temp_fid.write(f'{msg}\n')
 
+    @staticmethod
+    def column_enabled(name):
+        """ Returns False for optional data file columns which are disabled """
+        if name == 'temp':
+            return constants.TEMP_IN_DATA_FILE
+        if name == 'range':
+            return constants.AUTORANGE_ENABLED
+        if name == 'ref':
+            return constants.REF_IN_DATA_FILE
+        return True
+
+    def open_buffered(self, path, mode):
+        max_line = max(self.data_schema.max_line, self.temp_schema.max_line)
+        return BufferedWriter(
+                open(path, mode), 
+                max(constants.DATA_BUFFER_SIZE, max_line), 
+                constants.DATA_FLUSH_DT, 
+                constants.DATA_SYNC_DT,
+                slack=max_line,
+                )
+
+    @property
+    def buffered(self):
+        """ Returns the number of bytes buffered in RAM waiting to be written """
+        count = 0
+        if self.data_fid is not None:
+            count += self.data_fid.buffered
+            if self.binary:
+                count += self.record_buffer.pos
+        if self.temp_fid is not None:
+            count += self.temp_fid.buffered
+        return count
+
+    def binary_header(self):
+        header = binary_header_text(self.data_schema)
+        size = constants.BINARY_HEADER_SIZE
+        if len(header) + 1 > size:
+            raise ValueError(f'binary header longer than BINARY_HEADER_SIZE ({size} bytes)')
+        return (header + ' '*(size - len(header) - 1) + '\n').encode()
+
+    def open_data_file(self):
+        if self.binary:
+            self.data_fid = self.open_buffered(self.data_file_path, 'wb')
+            self.record_buffer.clear()
+            self.data_fid.write(self.binary_header())
+        else:
+            self.data_fid = self.open_buffered(self.data_file_path, 'wb')
+            if constants.DATA_FILE_HEADER:
+                self.write_data(self.data_schema.header())
+        self.segment_t_start = None
+
+    def close_data_file(self):
+        if self.data_fid is not None:
+            if self.binary:
+                self.record_buffer.flush(self.data_fid)
+            self.data_fid.close()
+            self.data_fid = None
+
+    def segment_full(self, t):
+        """ 
+        Returns True if the current data file segment has reached its duration
+        limit or the next record could take it past its size limit 
+        """
+        if self.segment_t_start is None:
+            # The first record always goes in a new segment
+            self.segment_t_start = t
+            return False
+        if constants.DATA_SEGMENT_MAX_DT is not None:
+            if t - self.segment_t_start >= constants.DATA_SEGMENT_MAX_DT:
+                return True
+        if constants.DATA_SEGMENT_MAX_SIZE is not None:
+            size = self.data_fid.bytes_written 
+            if self.binary:
+                size += self.record_buffer.pos
+            if size + self.row_max_size > constants.DATA_SEGMENT_MAX_SIZE:
+                return True
+        return False
+
+    def next_segment(self):
+        """ Closes the current data file segment and starts the next one """
+        self.close_data_file()
+        self.segment += 1
+        self.set_data_file_name()
+        self.open_data_file()
+
+    def set_data_file_name(self):
+        ext = 'bin' if self.binary else 'txt'
+        if self.segmented:
+            self.data_file_name = f'{constants.DATA_FILE_PREFIX}{self.file_count}_{self.segment}.{ext}'
+        else:
+            self.data_file_name = f'{constants.DATA_FILE_PREFIX}{self.file_count}.{ext}'
+        self.data_file_path = f'{constants.DATA_FILES_DIR}/{self.data_file_name}'
+
     def incr_file(self):
         self.file_count += 1
-        self.data_file_name = f'{constants.DATA_FILE_PREFIX}{self.file_count}.txt'
-        self.data_file_path = f'{constants.DATA_FILES_DIR}/{self.data_file_name}'
+        self.save_file_count()
+        self.segment = 1
+        self.set_data_file_name()
         self.temp_file_name = f'{constants.TEMP_FILE_PREFIX}{self.file_count}.txt'
         self.temp_file_path = f'{constants.DATA_FILES_DIR}/{self.temp_file_name}'
 
@@ -121,21 +331,36 @@ class DataLogger:
         if not constants.DATA_FILES_DIR in os.listdir():
             os.mkdir(constants.DATA_FILES_DIR)
 
-    @utils.if_read_write
-    def update(self, data):
-        t    = data['t']
-        volt = data['volt']
-        curr = data['curr']
-        temp = data['temp']
-        if constants.TEMP_IN_DATA_FILE and temp is not None:
-            self.write_data(f'{t:1.2f} {volt:1.2f} {curr:1.2f} {temp:1.2f}')
-        else:
-            self.write_data(f'{t:1.2f} {volt:1.2f} {curr:1.2f}')
+    @profiler.profile('data_logger.update')
+    def update(self, sample, temp=None):
+        """ 
+        Logs a sample, a SampleRecord of the data file columns with the time
+        in integer ms, and the temperature (C) or None 
+        """
+        # Checked here rather than with utils.if_read_write as the decorator's
+        # *args/**kwargs wrapper allocates on every call. 
+        if self.read_only:
+            return
+        t_ms = sample['t']
+        t = 0.001*t_ms
+        if self.data_fid is not None:
+            if self.segmented and self.segment_full(t):
+                self.next_segment()
+            if self.binary:
+                self.write_record(sample.values)
+            else:
+                self.write_values(self.data_fid, self.data_schema, sample.values)
         if constants.TEMP_SENSOR_ENABLED:
-            for index, window in enumerate(constants.TEMP_SENSOR_SCHEDULE):
-                t0, t1 = window
-                if t >= t0 and t <= t1 and temp is not None: 
-                    self.temp_averages[index].update(temp)
-                    temp_average = self.temp_averages[index].value
-                    self.write_temp(f'{t:1.2f} {temp:1.2f} {temp_average:1.2f}')
+            temp_values = self.temp_values
+            for average in self.temp_schedule.update(t_ms):
+                if temp is not None and self.temp_fid is not None:
+                    average.update(temp)
+                    temp_values[0] = t_ms
+                    temp_values[1] = temp
+                    temp_values[2] = average.value
+                    self.write_values(self.temp_fid, self.temp_schema, temp_values)
+            if self.temp_fid is not None:
+                # Rows are only written inside the schedule windows, so the
+                # tail of a window is flushed on time after it closes
+                self.temp_fid.flush_if_due()
 
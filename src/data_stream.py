@@ -0,0 +1,108 @@
+import struct
+import binascii
+from record_buffer import RecordPacker
+from data_logger import binary_header_text
+
+STREAM_SYNC = b'\xa5\x5a'
+FRAME_HEADER_FMT = '<2sBBHH'  # sync, type, record count, sequence number, payload size
+FRAME_HEADER_SIZE = struct.calcsize(FRAME_HEADER_FMT)
+FRAME_CRC_SIZE = 4
+FRAME_TYPE_SCHEMA = 0
+FRAME_TYPE_DATA = 1
+
+
+class DataStream:
+    """
+    Implements live streaming of the acquired data over a USB serial port,
+    usb_cdc.data, in a compact framed binary protocol.
+
+        stream = DataStream(usb_cdc.data, data_logger.data_schema, 16)
+        stream.start()
+        stream.update(sample)
+        stream.flush()
+
+    Each frame is
+
+        sync (2 bytes, a5 5a)
+        type (uint8, 0 = schema, 1 = data)
+        count (uint8, number of records)
+        seq (uint16, sequence number)
+        size (uint16, payload size in bytes)
+        payload
+        crc (uint32, CRC-32 of type through payload)
+
+    with little endian integers. A schema frame, whose payload is the binary
+    data file header text (see data_logger.binary_header_text), e.g. 
+    'RFWCV 2 <Iff t:ms volt:V curr:uA', is sent by start. Data frames carry
+    batch_size records of the schema's columns packed in its binary_fmt, taken
+    from a SampleRecord. Records are packed in place, without allocating, with
+    the same RecordPacker as the binary data files, into a preallocated frame
+    and the frame is sent when it is full (or on flush). The sequence number
+    increments for each frame, so the receiver can detect lost frames, and the
+    CRC lets it resynchronize after corrupted data. Frames are discarded, not
+    queued, when no host has the port open.
+
+    See host/stream_receiver.py for the host side.
+    """
+
+    def __init__(self, serial, schema, batch_size):
+        self.serial = serial
+        self.schema = schema
+        self.scales = schema.binary_scales
+        self.packer = RecordPacker(schema.binary_fmt)
+        self.record_size = self.packer.size
+        self.batch_size = min(max(batch_size, 1), 255)
+        payload_size = self.batch_size*self.record_size
+        self.frame = bytearray(FRAME_HEADER_SIZE + payload_size + FRAME_CRC_SIZE)
+        self.view = memoryview(self.frame)
+        # The CRC of a full frame is computed from this preallocated slice
+        self.crc_view = self.view[2:FRAME_HEADER_SIZE + payload_size]
+        self.count = 0
+        self.seq = 0
+        self.frames_sent = 0
+        self.frames_dropped = 0
+
+    def start(self):
+        """ Resets the sequence number and sends the schema frame """
+        self.count = 0
+        self.seq = 0
+        header = binary_header_text(self.schema).encode()
+        frame = bytearray(FRAME_HEADER_SIZE + len(header) + FRAME_CRC_SIZE)
+        frame[FRAME_HEADER_SIZE:FRAME_HEADER_SIZE + len(header)] = header
+        self.send(frame, memoryview(frame)[2:-FRAME_CRC_SIZE], FRAME_TYPE_SCHEMA, 0, len(header))
+
+    def update(self, sample):
+        self.append(sample.values)
+
+    def append(self, values):
+        pos = FRAME_HEADER_SIZE + self.count*self.record_size
+        self.packer.pack_into(self.frame, pos, values, self.scales)
+        self.count += 1
+        if self.count >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """ Sends any records waiting in the frame """
+        if self.count >= self.batch_size:
+            self.send(self.frame, self.crc_view, FRAME_TYPE_DATA, self.count, self.count*self.record_size)
+            self.count = 0
+        elif self.count > 0:
+            # Partial frames, only sent on flush, are sent from new slices
+            end = FRAME_HEADER_SIZE + self.count*self.record_size
+            frame = self.view[:end + FRAME_CRC_SIZE]
+            self.send(frame, self.view[2:end], FRAME_TYPE_DATA, self.count, self.count*self.record_size)
+            self.count = 0
+
+    def send(self, frame, crc_view, frame_type, count, size):
+        """ Sends the whole of frame, with the CRC of crc_view, its type through payload """
+        end = FRAME_HEADER_SIZE + size
+        struct.pack_into(FRAME_HEADER_FMT, frame, 0, STREAM_SYNC, frame_type, count, self.seq, size)
+        crc = binascii.crc32(crc_view)
+        struct.pack_into('<I', frame, end, crc)
+        self.seq = (self.seq + 1) & 0xffff
+        if self.serial.connected:
+            self.serial.write(frame)
+            self.frames_sent += 1
+        else:
+            self.frames_dropped += 1
+
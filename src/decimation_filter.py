@@ -0,0 +1,162 @@
+import ulab.numpy as np
+
+
+class BoxcarDecimator:
+    """
+    Boxcar (moving mean) decimator. Averages each group of factor samples.
+
+        stage = BoxcarDecimator(8)
+
+    """
+
+    def __init__(self, factor):
+        self.factor = factor
+
+    def decimate_factor(self, rate):
+        return self.factor
+
+    def output_size(self, num, rate):
+        """ Returns the number of samples and the rate of the output for num input samples """
+        factor = min(max(self.decimate_factor(rate), 1), num)
+        return num//factor, rate/factor
+
+    def process(self, x, rate):
+        factor = min(max(self.decimate_factor(rate), 1), len(x))
+        num = len(x)//factor
+        y = x[:num*factor].reshape((num, factor))
+        return self.reduce(y), rate/factor
+
+    def reduce(self, y):
+        return np.mean(y, axis=1)
+
+
+class MedianDecimator(BoxcarDecimator):
+    """
+    Moving median decimator. Takes the median of each group of factor samples,
+    which rejects isolated spikes.
+
+        stage = MedianDecimator(5)
+
+    """
+
+    def reduce(self, y):
+        return np.median(y, axis=1)
+
+
+class MainsDecimator(BoxcarDecimator):
+    """
+    Mains rejection decimator. Averages over groups of samples spanning one
+    period of the mains frequency, which nulls the mains frequency and its
+    harmonics. The group size is set from the sample rate of the block, so
+    the block has to span at least one whole mains period, which is checked
+    once at startup with FilterChain.check.
+
+        stage = MainsDecimator(60.0)
+
+    """
+
+    def __init__(self, mains_freq):
+        self.mains_freq = mains_freq
+
+    def decimate_factor(self, rate):
+        return int(rate/self.mains_freq + 0.5)
+
+    def output_size(self, num, rate):
+        if self.decimate_factor(rate) > num:
+            raise ValueError(f'{num} samples at {rate:.0f}/s is less than one {self.mains_freq} Hz period')
+        return super().output_size(num, rate)
+
+
+class FIRDecimator:
+    """
+    FIR filter followed by decimation by factor. Only the fully overlapped
+    (valid) part of the convolution is kept.
+
+        stage = FIRDecimator(taps, 4)
+
+    """
+
+    def __init__(self, taps, factor):
+        self.taps = np.array(taps)
+        self.factor = factor
+
+    def output_size(self, num, rate):
+        n = len(self.taps)
+        if num < n:
+            return 1, rate/num
+        return (num - n)//self.factor + 1, rate/self.factor
+
+    def process(self, x, rate):
+        n = len(self.taps)
+        if len(x) < n:
+            return np.array([np.mean(x)]), rate/len(x)
+        y = np.convolve(x, self.taps)[n-1:len(x)]
+        return y[::self.factor], rate/self.factor
+
+
+class CICDecimator(FIRDecimator):
+    """
+    Cascaded integrator-comb (CIC) decimator of the given order, implemented as
+    the equivalent FIR filter, i.e. a boxcar of length factor convolved with
+    itself order times, normalized to unity gain.
+
+        stage = CICDecimator(8, order=3)
+
+    """
+
+    def __init__(self, factor, order=3):
+        taps = np.ones(factor)
+        boxcar = np.ones(factor)
+        for i in range(order - 1):
+            taps = np.convolve(taps, boxcar)
+        super().__init__(taps/np.sum(taps), factor)
+
+
+class FilterChain:
+    """
+    A chain of decimation filter stages operating on ulab arrays.
+
+        chain = FilterChain([CICDecimator(4, 3), MainsDecimator(60.0)])
+        value = chain.process(block, sample_rate)
+
+    Each stage filters and decimates the block and the final value is the mean
+    of the output of the last stage. The chain can be created from a compact
+    spec, e.g. from constants.py
+
+        chain = FilterChain.from_spec([('cic', 4, 3), ('mains', 60.0)])
+
+    where the stage types are 'boxcar' (factor), 'median' (factor), 'mains'
+    (mains_freq), 'cic' (factor, order) and 'fir' (taps, factor).
+
+    The block length and sample rate are fixed, so the chain is checked once
+    for them at startup, which raises a ValueError if a mains stage gets less
+    than one mains period.
+
+        chain.check(512, sample_rate)
+
+    """
+
+    STAGE_TYPES = {
+            'boxcar' : BoxcarDecimator,
+            'median' : MedianDecimator,
+            'mains'  : MainsDecimator,
+            'cic'    : CICDecimator,
+            'fir'    : FIRDecimator,
+            }
+
+    def __init__(self, stages):
+        self.stages = stages
+
+    @classmethod
+    def from_spec(cls, spec):
+        return cls([cls.STAGE_TYPES[item[0]](*item[1:]) for item in spec])
+
+    def check(self, num, rate):
+        for stage in self.stages:
+            num, rate = stage.output_size(num, rate)
+
+    def process(self, x, rate):
+        for stage in self.stages:
+            x, rate = stage.process(x, rate)
+        return float(np.mean(x))
+
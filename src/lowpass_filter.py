@@ -1,3 +1,4 @@
+import math
 import ulab.numpy as np
 
 class LowpassFilter:
@@ -15,6 +16,14 @@ class LowpassFilter:
 
         filter.update(new_value)
 
+    A block of values, e.g. a ulab (or NumPy) array of samples taken with the
+    time step dt, can be filtered in one call. This gives the same result as
+    calling update for each value in turn but is computed vectorized as the
+    weighted sum of the block. The weights are computed once for the block
+    length and reused while it stays the same.
+
+        filter.update_many(values)
+
     """
 
     def __init__(self, freq_cutoff=1.0, value=0.0, dt=1.0):
@@ -29,6 +38,24 @@ class LowpassFilter:
     @freq_cutoff.setter
     def freq_cutoff(self, freq):
         self._alpha = (2.0*np.pi*self.dt*freq)/(2.0*np.pi*self.dt*freq+1)
+        self._weights = None
+        self._decay = 0.0
 
     def update(self, new_value):
         self.value = self._alpha*new_value + (1.0-self._alpha)*self.value
+
+    def update_many(self, values):
+        num = len(values)
+        if num == 0:
+            return
+        beta = 1.0 - self._alpha
+        if beta <= 0.0:
+            self.value = float(values[-1])
+            return
+        # y_n = beta**n*y_0 + alpha*sum_k beta**(n-1-k)*x_k
+        weights = self._weights
+        if weights is None or len(weights) != num:
+            weights = self._alpha*np.exp(math.log(beta)*np.arange(num - 1, -1, -1))
+            self._weights = weights
+            self._decay = beta**num
+        self.value = self._decay*self.value + float(np.sum(weights*values))
@@ -1,7 +1,15 @@
+import time
+import array
 import utils
+import profiler
 import board
 import analogio
+try:
+    import analogbufio
+except ImportError:
+    analogbufio = None
 import digitalio
+import ulab.numpy as np
 
 
 class Potentiostat:
@@ -15,6 +23,37 @@ class Potentiostat:
         
         pstat = Potentiostat(current_range='100uA', num_avg=10)
 
+    Alternatively a decimation filter chain (see decimation_filter.py) can be
+    given for the transimpedance amplifier channel. In which case each
+    measurement oversamples the channel at the maximum ADC rate into a buffer
+    of length oversample and reduces it to a single value with the filter chain.
+
+        chain = FilterChain([CICDecimator(4, 3), MainsDecimator(60.0)])
+        pstat = Potentiostat(tia_filter=chain, oversample=512)
+
+    The oversampling rate (samples/s) is available as pstat.ain_sample_rate.
+    It is the sample_rate with buffered acquisition and is otherwise measured
+    once, by timing a read of the buffer, when the potentiostat is created.
+    The filter chain is then checked against the buffer length and rate, so a
+    MainsDecimator stage given less than one mains period raises a ValueError
+    at startup.
+
+    On boards with switchable transimpedance amplifier resistors the digital
+    outputs which select each current range can be given as a dictionary of
+    board pin names. Setting current_range then switches the hardware as well
+    as the current scaling. 
+
+        pstat = Potentiostat(range_pins={'1uA': 'D5', '10uA': 'D6', '100uA': 'D9', '1000uA': 'D10'})
+
+    A calibration (see calibration.py) giving the gain and ADC offset of each
+    current range and the DAC offset can be set with the calibration property.
+    The calibration, current range and averaging are folded into precomputed
+    current scale and offset constants, so the current is a single
+    multiply-add of the integer sum of the samples whether or not it is
+    calibrated.
+
+        pstat.calibration = Calibration.load()
+
     The counter electrode can be connected/disconnected with the "connected" property.
 
         pstat.connected = True 
@@ -31,6 +70,12 @@ class Potentiostat:
 
         setpt_voltage = pstat.voltage
 
+    The DAC is only written when the DAC code changes. Set-point waveforms can
+    precompute the DAC codes (see waveform.py) and write them directly.
+
+        code = pstat.voltage_to_code(new_voltage_value)
+        pstat.write_dac_code(code, new_voltage_value)
+
     To get the current in/out of the working electrode you can read the current property. 
 
         current = pstat.current
@@ -42,6 +87,25 @@ class Potentiostat:
         tia_voltage:     get the transimpedance amplifier voltage
         ref_voltage:     get the reference electrode voltage
 
+    The current and the reference electrode voltage can be measured together.
+    The two channels are sampled interleaved in a single pass, so both
+    averages cover the same time window, except with buffered acquisition
+    where the blocks are read one after the other.
+
+        current, ref_voltage = pstat.measure()
+
+    Averaged measurements add up the raw uint16 counts as integers and apply
+    a single scale-and-offset at the end, so each sample costs one integer add
+    and each measurement a single float conversion. 
+
+    On boards with analogbufio (e.g. RP2040) the transimpedance amplifier
+    channel can be read with a BufferedIn at the given sample rate. Each
+    measurement then fills a preallocated uint16 buffer in one readinto call
+    and sums it with a single builtin sum. A ValueError is raised if the board
+    has no analogbufio.
+
+        pstat = Potentiostat(buffered=True, sample_rate=100000)
+
     """
 
     CURRENT_RANGE_TO_TIA_RESISTOR = {
@@ -52,28 +116,54 @@ class Potentiostat:
             }
     TIA_RESISTOR_TO_CURRENT_RANGE = {v:k for (k,v) in CURRENT_RANGE_TO_TIA_RESISTOR.items()}
 
-    def __init__(self, current_range='100uA', num_avg=15):
+    def __init__(self, current_range='100uA', num_avg=15, tia_filter=None, oversample=512, range_pins=None, calibration=None, buffered=False, sample_rate=100000):
 
-        self.current_range = current_range
-        self.num_avg = num_avg 
+        self.range_switches = {}
+        self.vgnd = None
+        self._calibration = calibration
+        self.averaging = num_avg 
+        self.tia_filter = tia_filter
+        self.oversample_buffer = None
+        if tia_filter is not None:
+            self.oversample_buffer = np.zeros(oversample, dtype=np.uint16)
+        self.ain_sample_rate = float(sample_rate)
 
         # Hardware connections 
         self.setp_aout = analogio.AnalogOut(board.A0)
         self.setp_aout_saved_value = 0.0
-        self.tia_ain = analogio.AnalogIn(board.A2)
+        self.setp_aout_code = None
+        if buffered:
+            if analogbufio is None:
+                raise ValueError('buffered acquisition requires analogbufio')
+            self.tia_ain = analogbufio.BufferedIn(board.A2, sample_rate=sample_rate)
+        else:
+            self.tia_ain = analogio.AnalogIn(board.A2)
         self.ref_ain = analogio.AnalogIn(board.A4)
         self.ctr_elect_switch = digitalio.DigitalInOut(board.D13)
         self.ctr_elect_switch.direction = digitalio.Direction.OUTPUT
 
+        # Optional current range select outputs
+        if range_pins is not None:
+            for range_name, pin_name in range_pins.items():
+                switch = digitalio.DigitalInOut(getattr(board, pin_name))
+                switch.direction = digitalio.Direction.OUTPUT
+                self.range_switches[range_name] = switch
+
         # Transimpedance amplifier resistor value
-        self.tia_resistor_ohm = self.CURRENT_RANGE_TO_TIA_RESISTOR[current_range]
+        self.current_range = current_range
 
         # System voltage (vpow) and virtual ground voltage (vgnd) 
-        self.vpow = self.tia_ain.reference_voltage  
+        self.vpow = self.ref_ain.reference_voltage  
         self.vgnd = 0.5*self.vpow                   
+        self.ain_scale = self.vpow/utils.UINT16_MAX_VALUE
+
+        if tia_filter is not None:
+            if not buffered:
+                self.ain_sample_rate = self.measure_ain_sample_rate(self.tia_ain, self.oversample_buffer)
+            tia_filter.check(oversample, self.ain_sample_rate)
 
         # Set initial state
-        self.offset = 0.0
+        self.calibration = calibration
         self.connected = False 
         self.voltage = 0.0
 
@@ -84,6 +174,42 @@ class Potentiostat:
     @current_range.setter
     def current_range(self, value):
         self.tia_resistor_ohm = self.CURRENT_RANGE_TO_TIA_RESISTOR[value]
+        for range_name, switch in self.range_switches.items():
+            switch.value = range_name == value
+        self.update_scaling()
+
+    @property
+    def calibration(self):
+        return self._calibration
+
+    @calibration.setter
+    def calibration(self, cal):
+        self._calibration = cal
+        if cal is None:
+            self.offset = 0.0
+        else:
+            self.offset = cal.dac_offset
+        self.update_scaling()
+
+    def update_scaling(self):
+        """ 
+        Precomputes the constants converting the transimpedance amplifier 
+        voltage, or the integer sum of num_avg raw samples, to current (A).
+        """
+        if self.vgnd is None:
+            return
+        gain = 1.0
+        adc_offset = 0.0
+        if self._calibration is not None:
+            gain = self._calibration.gain(self.current_range)
+            adc_offset = self._calibration.adc_offset(self.current_range)
+        self.tia_gain = gain/self.tia_resistor_ohm
+        self.tia_offset = -adc_offset*self.tia_gain
+        self.current_scale = self.ain_scale*self.tia_gain/self.num_avg
+        self.current_offset = self.tia_offset - self.vgnd*self.tia_gain
+
+    def tia_to_current(self, tia_voltage):
+        return tia_voltage*self.tia_gain + self.tia_offset
 
     @property
     def averaging(self):
@@ -92,6 +218,8 @@ class Potentiostat:
     @averaging.setter
     def averaging(self, num):
         self.num_avg = num 
+        self.ain_buffer = array.array('H', bytes(2*num))
+        self.update_scaling()
 
     @property
     def connected(self):
@@ -110,18 +238,35 @@ class Potentiostat:
 
     @voltage.setter
     def voltage(self,value):
+        self.write_dac_code(self.voltage_to_code(value), value)
+
+    def voltage_to_code(self,value):
+        """ Returns the set-point DAC code for the given set-point voltage """
         value_shifted = self.vgnd + value + self.offset
-        value_uint16 = utils.volt_to_uint16(value_shifted,self.vpow)
-        self.setp_aout.value = value_uint16
+        return utils.volt_to_uint16(value_shifted,self.vpow)
+
+    def write_dac_code(self,code,value):
+        """ 
+        Writes a precomputed DAC code for the set-point voltage value. The DAC
+        write is skipped if the code is unchanged.
+        """
+        if code != self.setp_aout_code:
+            self.setp_aout.value = code
+            self.setp_aout_code = code
         self.setp_aout_saved_value = value
 
     @property
+    @profiler.profile('pstat.current')
     def current(self):
-        value = self.tia_voltage/self.tia_resistor_ohm
-        return value
+        if self.tia_filter is not None:
+            return self.tia_to_current(self.tia_voltage)
+        total = self.read_ain_sum(self.tia_ain, self.num_avg)
+        return total*self.current_scale + self.current_offset
 
     @property
     def tia_voltage(self):
+        if self.tia_filter is not None:
+            return self.read_ain_filtered(self.tia_ain, self.tia_filter)
         return self.read_ain_avg(self.tia_ain, self.num_avg)
 
     @property
@@ -134,12 +279,66 @@ class Potentiostat:
         value = value_shifted - self.vgnd
         return value
 
-    def read_ain_avg(self,ain,num):
-        value = 0.0
+    def read_ain_raw(self,ain,buf=None):
+        """ Fills the preallocated (or given) sample buffer with raw uint16 values """
+        if buf is None:
+            buf = self.ain_buffer
+        if hasattr(ain, 'readinto'):
+            ain.readinto(buf)
+        else:
+            for i in range(len(buf)):
+                buf[i] = ain.value
+        return buf
+
+    def read_ain_sum(self,ain,num):
+        """ Returns the integer sum of num raw uint16 analog input samples """
+        if hasattr(ain, 'readinto'):
+            if num != len(self.ain_buffer):
+                self.ain_buffer = array.array('H', bytes(2*num))
+            # The builtin sum adds the counts as integers in C, in one call
+            # rather than a Python loop over the buffer
+            return sum(self.read_ain_raw(ain))
+        total = 0
         for i in range(num):
-            value += self.read_ain(ain)
-        return value/float(num)
-
-
-
+            total += ain.value
+        return total
 
+    def read_ain_avg(self,ain,num):
+        # Samples are summed as integers and converted to volts once
+        total = self.read_ain_sum(ain, num)
+        return total*self.ain_scale/num - self.vgnd
+
+    def read_ain_pair_avg(self,ain0,ain1,num):
+        """ Samples two analog inputs interleaved and returns both averages (V) """
+        total0 = 0
+        total1 = 0
+        for i in range(num):
+            total0 += ain0.value
+            total1 += ain1.value
+        scale = self.ain_scale/num
+        return total0*scale - self.vgnd, total1*scale - self.vgnd
+
+    def measure_voltages(self):
+        """ Returns the transimpedance amplifier and reference electrode voltages """
+        if self.tia_filter is not None or hasattr(self.tia_ain, 'readinto'):
+            return self.tia_voltage, self.ref_voltage
+        return self.read_ain_pair_avg(self.tia_ain, self.ref_ain, self.num_avg)
+
+    @profiler.profile('pstat.measure')
+    def measure(self):
+        """ Returns the current and reference electrode voltage measured together """
+        tia_voltage, ref_voltage = self.measure_voltages()
+        return self.tia_to_current(tia_voltage), ref_voltage
+
+    def measure_ain_sample_rate(self,ain,buf):
+        """ Returns the rate (samples/s) at which the analog input fills buf """
+        t0 = time.monotonic_ns()
+        self.read_ain_raw(ain, buf)
+        dt = time.monotonic_ns() - t0
+        return 1.0e9*len(buf)/max(dt, 1)
+
+    def read_ain_filtered(self,ain,chain):
+        """ Oversamples the analog input and reduces it to one value (V) with the filter chain """
+        buf = self.read_ain_raw(ain, self.oversample_buffer)
+        value = chain.process(buf*1.0, self.ain_sample_rate)
+        return value*self.ain_scale - self.vgnd
@@ -0,0 +1,95 @@
+"""
+profiler.py
+
+Lightweight hot-path profiler. Functions and methods decorated with profile
+record the number of calls, the cumulative time (time.monotonic_ns) and the
+cumulative change in allocated heap (gc.mem_alloc) in a named section.
+
+    import profiler
+
+    @profiler.profile('data_logger.update')
+    def update(self, data):
+        ...
+
+The profiler is enabled by setting constants.PROFILER_ENABLED to True. When it
+is disabled the decorator returns the function unchanged so there is no cost
+at run time. The statistics can be printed to the serial console, or written
+to a file, with dump and cleared with reset.
+
+    profiler.dump()
+    profiler.dump('profile.txt')
+
+Note, the heap change of a section is reduced by any garbage collection which
+runs inside it, so a negative value means that a collection ran.
+"""
+import gc
+import time
+import constants
+
+try:
+    mem_alloc = gc.mem_alloc
+except AttributeError:
+    # Not available on CPython, e.g. when running on the simulated hardware
+    def mem_alloc():
+        return 0
+
+
+class Section:
+
+    def __init__(self, name):
+        self.name = name
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.total_ns = 0
+        self.alloc = 0
+
+    def __str__(self):
+        mean_us = 1.0e-3*self.total_ns/self.count if self.count else 0.0
+        return f'{self.name:24s} count={self.count:8d} total={1.0e-6*self.total_ns:10.1f}ms mean={mean_us:9.1f}us alloc={self.alloc:8d}B'
+
+
+sections = {}
+
+
+def get_section(name):
+    if name not in sections:
+        sections[name] = Section(name)
+    return sections[name]
+
+
+def profile(name):
+    """ Decorator which records calls to the decorated function in the named section """
+    if not constants.PROFILER_ENABLED:
+        return lambda func: func
+    section = get_section(name)
+    def decorator(func):
+        def wrapper(*args, **kwargs):
+            alloc0 = mem_alloc()
+            t0 = time.monotonic_ns()
+            result = func(*args, **kwargs)
+            section.total_ns += time.monotonic_ns() - t0
+            section.alloc += mem_alloc() - alloc0
+            section.count += 1
+            return result
+        return wrapper
+    return decorator
+
+
+def reset():
+    for section in sections.values():
+        section.reset()
+
+
+def dump(path=None):
+    """ Prints the statistics to the serial console or, if given, writes them to the file path """
+    lines = [str(section) for section in sections.values()]
+    if path is None:
+        for line in lines:
+            print(line)
+    else:
+        with open(path, 'w') as f:
+            for line in lines:
+                f.write(f'{line}\n')
+
@@ -0,0 +1,77 @@
+import struct
+
+
+class RecordPacker:
+    """
+    Packs binary records of the given struct format field by field, so a
+    record is packed from a list of values, each multiplied by a scale,
+    without allocating.
+
+        packer = RecordPacker('<Iff')
+        pos = packer.pack_into(buf, pos, values, scales)
+
+    """
+
+    def __init__(self, fmt):
+        self.fmt = fmt
+        self.size = struct.calcsize(fmt)
+        self.field_fmts = [fmt[0] + code for code in fmt[1:]]
+        self.field_sizes = [struct.calcsize(field_fmt) for field_fmt in self.field_fmts]
+
+    def pack_into(self, buf, pos, values, scales):
+        """ Packs a record into buf at pos and returns the position after it """
+        field_fmts = self.field_fmts
+        field_sizes = self.field_sizes
+        for i in range(len(values)):
+            struct.pack_into(field_fmts[i], buf, pos, values[i]*scales[i])
+            pos += field_sizes[i]
+        return pos
+
+
+class RecordBuffer:
+    """
+    Implements a fixed-size RAM buffer of packed binary records which is
+    written to a file in large blocks.
+
+        record_buffer = RecordBuffer('<Iff', 2048)
+
+    The buffer holds as many records of the given struct format as fit in
+    the given size in bytes. It is allocated once and records are packed in
+    place. A record is appended from a list of values, each multiplied by a
+    scale, without allocating, with a RecordPacker
+
+        record_buffer.append_values(fid, values, scales)
+
+    When the buffer is full its contents are written to the file in a single
+    write. Any remaining records are written by calling flush.
+
+        record_buffer.flush(fid)
+
+    """
+
+    def __init__(self, fmt, size):
+        self.fmt = fmt
+        self.packer = RecordPacker(fmt)
+        self.record_size = self.packer.size
+        self.num_records = max(size//self.record_size, 1)
+        self.buffer = bytearray(self.num_records*self.record_size)
+        self.view = memoryview(self.buffer)
+        self.pos = 0
+
+    def append_values(self, fid, values, scales):
+        self.pos = self.packer.pack_into(self.buffer, self.pos, values, scales)
+        if self.pos >= len(self.buffer):
+            self.flush(fid)
+
+    def flush(self, fid):
+        if self.pos == len(self.buffer):
+            # A full buffer is written from the preallocated view
+            fid.write(self.view)
+            self.pos = 0
+        elif self.pos > 0:
+            fid.write(self.view[:self.pos])
+            self.pos = 0
+
+    def clear(self):
+        self.pos = 0
+
@@ -1,4 +1,27 @@
+import ulab.numpy as np
+
+
 class RunningAverage:
+    """
+    Implements a numerically stable running average and variance using
+    Welford's algorithm.
+
+        average = RunningAverage()
+        average.update(new_value)
+
+    Blocks of values, e.g. ulab (or NumPy) arrays, can be added in one call. 
+    The block statistics are computed vectorized and combined with the
+    running statistics.
+
+        average.update_many(values)
+
+    The statistics are available as
+
+        average.value:     the mean of the values
+        average.count:     the number of values
+        average.variance:  the sample variance of the values
+
+    """
 
     def __init__(self):
         self.reset()
@@ -6,7 +29,28 @@ class RunningAverage:
     def reset(self):
         self.value = 0.0
         self.count = 0
+        self.m2 = 0.0
+
+    @property
+    def variance(self):
+        if self.count < 2:
+            return 0.0
+        return self.m2/(self.count - 1)
 
     def update(self, value):
-        self.value = (self.count*self.value + value)/(self.count + 1)
         self.count += 1
+        delta = value - self.value
+        self.value += delta/self.count
+        self.m2 += delta*(value - self.value)
+
+    def update_many(self, values):
+        num = len(values)
+        if num == 0:
+            return
+        mean = float(np.mean(values))
+        m2 = float(np.sum((values - mean)**2))
+        count = self.count + num
+        delta = mean - self.value
+        self.value += delta*num/count
+        self.m2 += m2 + delta*delta*self.count*num/count
+        self.count = count
@@ -0,0 +1,38 @@
+NAN = float('nan')
+
+
+class SampleRecord:
+    """
+    Implements a preallocated record of the values of one sample, with one
+    slot per column of a ColumnSchema, which is reused for every sample so
+    passing samples from the app to the data logger and stream doesn't
+    allocate.
+
+        sample = SampleRecord(data_logger.data_schema)
+        sample['t'] = t
+        sample['curr'] = curr
+
+    Values of columns which aren't in the schema are ignored and values of
+    None are stored as nan. The values, in base units and in column order,
+    are available as
+
+        sample.values
+
+    """
+
+    def __init__(self, schema):
+        self.names = schema.names
+        self.index = {name: i for (i, name) in enumerate(schema.names)}
+        self.values = [NAN]*len(schema.names)
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, name):
+        return self.values[self.index[name]]
+
+    def __setitem__(self, name, value):
+        i = self.index.get(name)
+        if i is not None:
+            self.values[i] = NAN if value is None else value
+
@@ -0,0 +1,146 @@
+import time
+
+
+class PeriodicTask:
+    """
+    A task which is run with a fixed period by the Scheduler.
+
+        task = PeriodicTask('display', display_func, 0.25)
+
+    Deadlines are advanced by exactly one period each time the task is run so
+    that the average rate is fixed. If a task starts after its next deadline
+    has already passed the missed deadlines are skipped, rather than run back
+    to back, and counted as overruns. A task with a period of zero is always
+    due, i.e. it runs as fast as possible. 
+
+        task.count:        number of times the task has been run
+        task.overruns:     number of missed deadlines
+        task.max_late:     maximum lateness (s) of the task start time
+
+    """
+
+    def __init__(self, name, func, period):
+        self.name = name
+        self.func = func
+        self.period = period
+        self.t_next = 0.0
+        self.reset(0.0)
+
+    def reset(self, t):
+        """ Sets the next deadline to time t and clears the statistics """
+        self.t_next = t
+        self.count = 0
+        self.overruns = 0
+        self.max_late = 0.0
+
+    def is_due(self, t):
+        return t >= self.t_next
+
+    def run(self, t):
+        late = t - self.t_next
+        if late > self.max_late:
+            self.max_late = late
+        self.func()
+        self.count += 1
+        self.t_next += self.period
+        if self.period > 0 and t >= self.t_next:
+            missed = int((t - self.t_next)/self.period) + 1
+            self.overruns += missed
+            self.t_next += missed*self.period
+
+
+class Scheduler:
+    """
+    Implements a simple deadline based scheduler for periodic tasks.
+
+        scheduler = Scheduler()
+        scheduler.add_task('acquire', acquire_func, 0.05)
+        scheduler.add_task('display', display_func, 0.25)
+        scheduler.run()
+
+    Tasks are prioritized in the order in which they are added. After each task
+    is run the task list is checked again from the start so that a high
+    priority task is never kept waiting by more than one lower priority task.
+    When no task is due the scheduler sleeps until the next deadline.
+
+    The clock and sleep functions can be given as arguments, e.g. for testing
+    on a host PC with a simulated clock.
+
+        scheduler = Scheduler(clock=fake_clock, sleep=fake_sleep)
+
+    Alternatively each task can be run as a separate coroutine with the same
+    deadline tracking, e.g. with asyncio, using the run_task method. 
+
+        await scheduler.run_task('acquire', asyncio.sleep)
+
+    A coroutine only sees a reset_task when it next wakes, so to start timing
+    from a task's next run, e.g. when acquisition starts, use its existing
+    deadline rather than moving it.
+
+        t_start = scheduler.next_deadline('acquire')
+        scheduler.reset_task('acquire', t_start)
+
+    """
+
+    def __init__(self, clock=time.monotonic, sleep=time.sleep):
+        self.clock = clock
+        self.sleep = sleep
+        self.tasks = []
+        self.task_by_name = {}
+
+    def add_task(self, name, func, period):
+        task = PeriodicTask(name, func, period)
+        task.reset(self.clock())
+        self.tasks.append(task)
+        self.task_by_name[name] = task
+        return task
+
+    def reset_task(self, name, t=None):
+        """ Restarts the named task with its next deadline at time t (default now) """
+        if t is None:
+            t = self.clock()
+        self.task_by_name[name].reset(t)
+
+    def next_deadline(self, name):
+        """ Returns the time of the next deadline of the named task """
+        return self.task_by_name[name].t_next
+
+    def run_pending(self):
+        """ Runs the highest priority task which is due. Returns True if a task was run. """
+        t = self.clock()
+        for task in self.tasks:
+            if task.is_due(t):
+                task.run(t)
+                return True
+        return False
+
+    def time_to_next(self):
+        t_next = min(task.t_next for task in self.tasks)
+        return max(t_next - self.clock(), 0.0)
+
+    def run(self, num_iter=None):
+        """ Runs the tasks forever or for num_iter passes of the scheduler loop """
+        count = 0
+        while num_iter is None or count < num_iter:
+            if not self.run_pending():
+                self.sleep(self.time_to_next())
+            count += 1
+
+    async def run_task(self, name, sleep):
+        """ Runs the named task forever as a coroutine, awaiting sleep between deadlines """
+        task = self.task_by_name[name]
+        while True:
+            t = self.clock()
+            if task.is_due(t):
+                task.run(t)
+            await sleep(max(task.t_next - self.clock(), 0.0))
+
+    @property
+    def overruns(self):
+        return {task.name: task.overruns for task in self.tasks}
+
+    def report(self):
+        """ Prints the task statistics to the serial console """
+        for task in self.tasks:
+            print(f'{task.name}: count={task.count} overruns={task.overruns} max_late={task.max_late:1.4f}s')
+
@@ -0,0 +1,79 @@
+import array
+from running_average import RunningAverage
+
+
+class TempSchedule:
+    """
+    Implements the temperature sensor schedule, the time windows during which
+    the temperature and its running average over the window are logged to the
+    temperature file.
+
+        schedule = TempSchedule.from_spec(constants.TEMP_SENSOR_SCHEDULE)
+
+    The spec is a list of windows (t_start, t_stop) and/or periodic windows
+    ('periodic', t_start, period, width, count), which expands to count
+    windows of width seconds starting every period seconds from t_start, e.g.
+
+        [(5.0, 10.0), ('periodic', 60.0, 60.0, 5.0, 100)]
+
+    The windows are sorted by start time and stored in arrays, as integer ms
+    so the boundaries are exact however long the run and compare directly
+    with the integer ms sample times. As the time
+    increases a cursor moves through the windows, adding them to the active
+    list when they start and removing them when they stop, so finding the
+    active windows is amortized O(1) per sample however long the schedule.
+    The running averages of the active windows are taken from a small pool
+    and reset when a window starts.
+
+        for average in schedule.update(t_ms):
+            average.update(temp)
+
+    The schedule is rewound at the start of each run with reset.
+    """
+
+    def __init__(self, windows):
+        windows = sorted(windows)
+        self.starts = array.array('l', [round(1000*t0) for (t0, t1) in windows])
+        self.stops = array.array('l', [round(1000*t1) for (t0, t1) in windows])
+        self.pool = []
+        self.active = []
+        self.active_stops = []
+        self.reset()
+
+    def __len__(self):
+        return len(self.starts)
+
+    def reset(self):
+        self.cursor = 0
+        self.pool.extend(self.active)
+        self.active.clear()
+        self.active_stops.clear()
+
+    def update(self, t):
+        """ Advances the schedule to time t (integer ms) and returns the running averages of the active windows """
+        for i in range(len(self.active) - 1, -1, -1):
+            if t > self.active_stops[i]:
+                self.pool.append(self.active.pop(i))
+                self.active_stops.pop(i)
+        num = len(self.starts)
+        while self.cursor < num and self.starts[self.cursor] <= t:
+            stop = self.stops[self.cursor]
+            if t <= stop:
+                average = self.pool.pop() if self.pool else RunningAverage()
+                average.reset()
+                self.active.append(average)
+                self.active_stops.append(stop)
+            self.cursor += 1
+        return self.active
+
+    @classmethod
+    def from_spec(cls, spec):
+        windows = []
+        for item in spec:
+            if item[0] == 'periodic':
+                t_start, period, width, count = item[1:]
+                windows.extend([(t_start + i*period, t_start + i*period + width) for i in range(count)])
+            else:
+                windows.append(tuple(item))
+        return cls(windows)
+
@@ -8,10 +8,45 @@ from adafruit_onewire.bus import OneWireBus
 
 class TemperatureSensor:
 
+    """
+    Reads the optional DS18B20 temperature sensor without blocking the
+    acquisition loop.
+
+        temperature_sensor = TemperatureSensor()
+
+    Conversions run continuously. When polled with update each call does at
+    most one OneWire transaction, reading the finished conversion on one call
+    and starting the next conversion on a later one. Alternatively the sensor
+    is run as a coroutine, see run.
+
+    Each reading is timestamped (time.monotonic) at the midpoint of its
+    conversion. The latest reading is available as
+
+        temperature_sensor.value
+
+    and the temperature at time t, e.g. the time of a current sample, is
+    estimated from the last two readings with
+
+        temp = temperature_sensor.value_at(t)
+
+    Readings always lag the current time, as each is only read a conversion
+    delay (plus margin) after its timestamp, so this extrapolates along the
+    slope between the last two readings. The extrapolation is bounded by the
+    read latency plus the interval between readings, i.e. it covers the time
+    until the next reading is due, which keeps logged temperatures in line
+    with the current while bounding the error if the temperature changes
+    direction.
+    """
+
     READY_MARGIN = 1.2
 
     def __init__(self):
         self.value = None 
+        self.t_value = None
+        self.slope = 0.0
+        self.max_extrapolation = 0.0
+        self.t_read = None
+        self.restart_pending = False
         self.have_sensor = False
 
         if constants.TEMP_SENSOR_ENABLED:
@@ -27,15 +62,51 @@ class TemperatureSensor:
             else:
                 self.have_sensor = True
                 self.sensor.resolution = constants.TEMP_SENSOR_RESOLUTION
-                self.conversion_delay = self.sensor.start_temperature_read()
-                self.t_ready = self.next_t_ready()
+                self.start_conversion()
+
+    def start_conversion(self):
+        self.conversion_delay = self.sensor.start_temperature_read()
+        self.t_conversion = time.monotonic()
+        self.t_ready = self.t_conversion + self.READY_MARGIN*self.conversion_delay
 
-    def next_t_ready(self):
-        return self.READY_MARGIN*self.conversion_delay + time.monotonic()
+    def read_conversion(self):
+        value = self.sensor.read_temperature()
+        t_read = time.monotonic()
+        t_value = self.t_conversion + 0.5*self.conversion_delay
+        if self.value is not None and t_value > self.t_value:
+            self.slope = (value - self.value)/(t_value - self.t_value)
+            self.max_extrapolation = (t_read - t_value) + (t_read - self.t_read)
+        self.value = value
+        self.t_value = t_value
+        self.t_read = t_read
+
+    def value_at(self, t):
+        """ Returns the estimated temperature at time t (time.monotonic) or None """
+        if self.value is None:
+            return None
+        dt = min(max(t - self.t_value, -self.max_extrapolation), self.max_extrapolation)
+        return self.value + self.slope*dt
 
     @utils.with_temp_sensor
     def update(self):
-        if time.monotonic() > self.t_ready: 
-            self.value = self.sensor.read_temperature()
-            self.sensor.start_temperature_read()
-            self.t_ready = self.next_t_ready()
+        if self.restart_pending:
+            self.start_conversion()
+            self.restart_pending = False
+        elif time.monotonic() > self.t_ready: 
+            self.read_conversion()
+            self.restart_pending = True
+
+    async def run(self, sleep):
+        """ 
+        Runs the sensor as a coroutine which awaits sleep for the conversion
+        delay rather than polling for readiness. The read and the restart of
+        the conversion are separated by a yield so other tasks can run between
+        the two OneWire transactions.
+        """
+        if not (constants.TEMP_SENSOR_ENABLED and self.have_sensor):
+            return
+        while True:
+            await sleep(max(self.t_ready - time.monotonic(), 0.0))
+            self.read_conversion()
+            await sleep(0)
+            self.start_conversion()
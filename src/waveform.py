@@ -0,0 +1,86 @@
+import array
+
+
+class Waveform:
+    """
+    Implements a programmable set-point voltage waveform driven from a
+    precomputed table of DAC codes.
+
+        waveform = Waveform.from_spec(spec, dt, pstat)
+
+    The waveform is given as a list of segments of (number of samples, voltage)
+    which are converted to DAC codes once, when the waveform is created, using
+    the potentiostat's voltage_to_code method. The table is stored run-length
+    encoded, as arrays of DAC codes and segment end indices, so long runs don't
+    need a table entry per sample. Segment lengths are rounded to the nearest
+    whole sample, and a segment shorter than half a sample raises ValueError.
+
+    The DAC code and voltage for a sample index are looked up with
+
+        code, volt = waveform.lookup(index)
+
+    Lookups move a cursor through the segments so, for increasing sample
+    indices, each lookup is O(1) and involves no float to DAC conversion. Past
+    the end of the waveform the last value is held and waveform.done is True.
+
+    Waveforms can be created from compact specs, with durations in seconds and
+    dt the sample period:
+
+        ('steps', [(duration, volt), ...])
+        ('staircase', volt_start, volt_stop, volt_step, step_duration)
+        ('pulse', volt_base, volt_pulse, period, width, count)
+
+    """
+
+    def __init__(self, segments, pstat):
+        self.codes = array.array('H', [pstat.voltage_to_code(volt) for (num, volt) in segments])
+        self.volts = array.array('f', [volt for (num, volt) in segments])
+        self.ends = array.array('L')
+        end = 0
+        for (num, volt) in segments:
+            num_int = int(num + 0.5)
+            if num_int < 1:
+                raise ValueError(f'waveform segment at {volt} V is shorter than one sample')
+            end += num_int
+            self.ends.append(end)
+        self.cursor = 0
+        self.done = False
+
+    def __len__(self):
+        return self.ends[-1]
+
+    def reset(self):
+        self.cursor = 0
+        self.done = False
+
+    def lookup(self, index):
+        ends = self.ends
+        if self.cursor > 0 and index < ends[self.cursor - 1]:
+            # Index moved backwards, search again from the start 
+            self.cursor = 0
+        last = len(ends) - 1
+        while self.cursor < last and index >= ends[self.cursor]:
+            self.cursor += 1
+        self.done = index >= ends[last]
+        return self.codes[self.cursor], self.volts[self.cursor]
+
+    @classmethod
+    def from_spec(cls, spec, dt, pstat):
+        kind = spec[0]
+        if kind == 'steps':
+            segments = [(duration/dt, volt) for (duration, volt) in spec[1]]
+        elif kind == 'staircase':
+            volt_start, volt_stop, volt_step, step_duration = spec[1:]
+            num_steps = int(abs(volt_stop - volt_start)/abs(volt_step) + 1.5)
+            sign = 1.0 if volt_stop >= volt_start else -1.0
+            segments = [(step_duration/dt, volt_start + sign*i*abs(volt_step)) for i in range(num_steps)]
+        elif kind == 'pulse':
+            volt_base, volt_pulse, period, width, count = spec[1:]
+            segments = []
+            for i in range(count):
+                segments.append((width/dt, volt_pulse))
+                segments.append(((period - width)/dt, volt_base))
+        else:
+            raise ValueError(f'unknown waveform {kind}')
+        return cls(segments, pstat)
+